@@ -0,0 +1,146 @@
+"""
+Single-file patch bundles, so a translation can ship one patch.bundle instead
+of a patch/ folder with a hundred .xdelta files in it.
+
+Layout:
+    8 bytes   magic (PATCH_BUNDLE_MAGIC)
+    2 bytes   format version, little-endian
+    4 bytes   length of the index, little-endian
+    index     utf-8 json: {"sha1": hash of all payloads,
+                           "patches": [{"name", "offset", "length", "sha1"}, ...]}
+    payloads  the patches back to back; offsets are from the start of this section
+
+PatchBundle mmaps the file and hands out memoryview slices of it, so reading
+a patch doesn't copy it, and the whole bundle can be checked with one hash.
+
+    python bundle.py patch patch.bundle
+"""
+
+import sys
+import json
+import mmap
+import struct
+from collections import OrderedDict
+from hashlib import sha1
+from os import listdir
+from os.path import basename, isfile, join as pathjoin
+
+PATCH_BUNDLE_MAGIC = b'PACHYBDL'
+PATCH_BUNDLE_VERSION = 1
+BUNDLE_FILENAME = 'patch.bundle'
+HEADER = struct.Struct('<8sHI')
+
+
+class BundleError(Exception):
+    def __init__(self, message, errors=[]):
+        super(BundleError, self).__init__(message)
+
+
+def write_bundle(bundle_path, patch_paths):
+    """Bundle these patch files (stored under their basenames). Returns the bundle's sha1."""
+    entries = []
+    payload_hash = sha1()
+    offset = 0
+    for p in patch_paths:
+        with open(p, 'rb') as f:
+            data = f.read()
+        payload_hash.update(data)
+        entries.append(OrderedDict([
+            ('name', basename(p)),
+            ('offset', offset),
+            ('length', len(data)),
+            ('sha1', sha1(data).hexdigest()),
+        ]))
+        offset += len(data)
+
+    index = json.dumps(OrderedDict([('sha1', payload_hash.hexdigest()), ('patches', entries)])).encode('utf-8')
+    with open(bundle_path, 'wb') as out:
+        out.write(HEADER.pack(PATCH_BUNDLE_MAGIC, PATCH_BUNDLE_VERSION, len(index)))
+        out.write(index)
+        for p in patch_paths:
+            with open(p, 'rb') as f:
+                out.write(f.read())
+    return payload_hash.hexdigest()
+
+
+def bundle_dir(patch_dir, bundle_path):
+    """Bundle every file in a patch folder."""
+    patch_paths = [pathjoin(patch_dir, f) for f in sorted(listdir(patch_dir))
+                   if isfile(pathjoin(patch_dir, f))]
+    return write_bundle(bundle_path, patch_paths)
+
+
+class PatchBundle(object):
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, index_length = HEADER.unpack_from(self._mmap, 0)
+            if magic != PATCH_BUNDLE_MAGIC:
+                raise BundleError("%s is not a patch bundle" % path)
+            if version > PATCH_BUNDLE_VERSION:
+                raise BundleError("%s needs a newer version of Pachy98" % path)
+            self._payload_start = HEADER.size + index_length
+            index = json.loads(self._mmap[HEADER.size:self._payload_start].decode('utf-8'))
+        except (struct.error, ValueError) as e:
+            self.close()
+            raise BundleError("%s is corrupted: %s" % (path, e))
+        except BundleError:
+            self.close()
+            raise
+
+        self.sha1 = index['sha1']
+        self.entries = OrderedDict((e['name'], e) for e in index['patches'])
+        self._view = memoryview(self._mmap)
+        # Slices handed out by get(); close() releases them so the mmap can close.
+        self._slices = []
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def names(self):
+        return list(self.entries)
+
+    def get(self, name):
+        """A patch's bytes, as a memoryview into the mmapped bundle. It's only good until close()."""
+        e = self.entries[name]
+        start = self._payload_start + e['offset']
+        data = self._view[start:start + e['length']]
+        self._slices.append(data)
+        return data
+
+    def verify(self):
+        """Whether all the payloads together match the bundle's hash."""
+        return sha1(self._view[self._payload_start:]).hexdigest() == self.sha1
+
+    def verify_patch(self, name):
+        return sha1(self.get(name)).hexdigest() == self.entries[name]['sha1']
+
+    def close(self):
+        for data in getattr(self, '_slices', []):
+            data.release()
+        self._slices = []
+        if getattr(self, '_view', None) is not None:
+            self._view.release()
+            self._view = None
+        if getattr(self, '_mmap', None) is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python bundle.py patch_dir patch.bundle")
+        sys.exit(1)
+    print("Bundled %s (sha1 %s)" % (sys.argv[2], bundle_dir(sys.argv[1], sys.argv[2])))
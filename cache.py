@@ -0,0 +1,142 @@
+"""
+Build cache for reinsertion scripts.
+Remembers what each gamefile was built from (its original file, its pointer
+sheet and every Translation row), so a gamefile whose inputs haven't changed
+can skip its block/pointer edits and reuse the file it wrote last time.
+
+Typical use in a reinserter:
+
+    cache = BuildCache('build_cache.json')
+    for gamefile in gamefiles:
+        translations = dump.get_translations(gamefile)
+        if cache.is_fresh(gamefile, translations):
+            cache.reuse(gamefile, path_in_disk='GAME')
+            continue
+        ...block and pointer edits...
+        written = gamefile.write(path_in_disk='GAME')
+        cache.record(gamefile, translations, written)
+    cache.save()
+"""
+
+import json
+import logging
+from hashlib import sha1
+from os import path
+try:
+    from .utils import file_hash
+except ImportError:
+    from utils import file_hash
+
+CACHE_VERSION = 1
+
+
+def _digest(value):
+    return sha1(repr(value).encode('utf-8')).hexdigest()
+
+
+def translation_hash(t):
+    """Hash of everything in a Translation row that can change the output."""
+    return _digest((t.location, t.cd_location, t.compressed_location,
+                    t.total_location, t.japanese, t.english, t.prefix,
+                    t.suffix, t.category, t.portrait, t.command, t.pointers))
+
+
+def pointers_hash(gamefile):
+    """Hash of the pointer sheet rows a gamefile was loaded with."""
+    if not gamefile.pointers:
+        return None
+    rows = sorted((p.original_text_location, p.original_location)
+                  for ptrs in gamefile.pointers.values() for p in ptrs)
+    return _digest(rows)
+
+
+class BuildCache(object):
+    """
+    Per-gamefile record of input hashes and the output they produced.
+    Stored as json, keyed by the gamefile's source path.
+    """
+    def __init__(self, path='build_cache.json'):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('version') == CACHE_VERSION:
+                self.entries = cached['gamefiles']
+        except (IOError, ValueError, KeyError):
+            # Missing or unreadable cache; everything gets rebuilt.
+            pass
+
+    def fingerprint(self, gamefile, translations, extra=None):
+        """
+        Hashes of a gamefile's inputs. "extra" is anything else the build
+        depends on (a reinserter version string, settings...).
+        """
+        return {
+            'original': sha1(gamefile.original_filestring).hexdigest(),
+            'pointers': pointers_hash(gamefile),
+            'translations': [translation_hash(t) for t in translations],
+            'extra': _digest(extra),
+        }
+
+    def is_fresh(self, gamefile, translations, extra=None):
+        """True if the last build used the same inputs and its output is intact."""
+        entry = self.entries.get(gamefile.path)
+        if entry is None:
+            return False
+        if entry['inputs'] != self.fingerprint(gamefile, translations, extra):
+            return False
+        output = entry['output']
+        return path.isfile(output) and file_hash(output) == entry['output_hash']
+
+    def changed_rows(self, gamefile, translations):
+        """The translations that are new or different since the last build."""
+        entry = self.entries.get(gamefile.path)
+        if entry is None:
+            return list(translations)
+        previous = set(entry['inputs']['translations'])
+        return [t for t in translations if translation_hash(t) not in previous]
+
+    def output_path(self, gamefile):
+        entry = self.entries.get(gamefile.path)
+        return entry['output'] if entry else None
+
+    def entry(self, gamefile, translations, output_path, extra=None):
+        """
+        The (key, entry) pair that record() would store. Worker processes
+        return this so the parent process can update() its own cache.
+        """
+        return gamefile.path, {
+            'inputs': self.fingerprint(gamefile, translations, extra),
+            'output': output_path,
+            'output_hash': file_hash(output_path),
+        }
+
+    def update(self, key, entry):
+        self.entries[key] = entry
+
+    def record(self, gamefile, translations, output_path, extra=None):
+        """Remember the inputs of a finished build and the file it wrote."""
+        self.update(*self.entry(gamefile, translations, output_path, extra))
+
+    def reuse(self, gamefile, path_in_disk=None, skip_disk=False):
+        """
+        Put the last written output back in the dest disk instead of rebuilding it.
+        Returns the output's path, or None if the gamefile was never built.
+        """
+        output = self.output_path(gamefile)
+        if output is None:
+            return None
+        with open(output, 'rb') as f:
+            gamefile.filestring = f.read()
+        if not skip_disk:
+            logging.info("Reusing %s" % output)
+            gamefile.dest_disk.insert(output, path_in_disk=path_in_disk)
+        return output
+
+    def forget(self, gamefile):
+        self.entries.pop(gamefile.path, None)
+
+    def save(self):
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'gamefiles': self.entries}, f, indent=2)
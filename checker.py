@@ -0,0 +1,165 @@
+"""
+Checks every translation in a dump against the text window limits in
+rominfo.py (LINE_LENGTH, WINDOW_LINES, NEWLINE_CHAR), so overflowing lines
+show up in a report instead of in an emulator.
+
+Widths come from an optional glyph width table ({character: width}, e.g.
+for a VWF). Characters not in it are as wide as their Shift JIS encoding:
+1 for ASCII/halfwidth, 2 for fullwidth. Control codes take up no space,
+unless their bytes are the newline.
+
+    python checker.py dump.xlsx [rominfo.py] [glyph_widths.json]
+"""
+
+import re
+import sys
+import json
+from collections import namedtuple
+from functools import lru_cache
+from importlib.util import spec_from_file_location, module_from_spec
+
+# kind is 'width' (a line is too long) or 'lines' (too many lines).
+Overflow = namedtuple('Overflow', ['sheet', 'filename', 'location', 'line', 'kind', 'size', 'limit', 'text'])
+
+
+def _text(s):
+    return s.decode('shift-jis') if isinstance(s, bytes) else s
+
+
+class WidthChecker(object):
+    def __init__(self, line_length, window_lines=None, newline='\n', control_codes={}, glyph_widths=None):
+        # 0/None turns a check off, like the blank rominfo.py defaults.
+        self.line_length = line_length or None
+        self.window_lines = window_lines or None
+        self.newline = _text(newline)
+        self.glyph_widths = {_text(k): v for k, v in (glyph_widths or {}).items()}
+
+        newline_bytes = self.newline.encode('shift-jis')
+        self.newline_codes = set()
+        names = []
+        for name, value in control_codes.items():
+            name = _text(name)
+            if not name:
+                continue
+            names.append(name)
+            if value and newline_bytes in value:
+                self.newline_codes.add(name)
+
+        # Line breaks split the text, then the other codes get dropped.
+        breaks = sorted(self.newline_codes, key=len, reverse=True) + [self.newline]
+        self._breaks = re.compile('|'.join(re.escape(b) for b in breaks))
+        others = sorted(set(names) - self.newline_codes, key=len, reverse=True)
+        self._codes = re.compile('|'.join(re.escape(c) for c in others)) if others else None
+
+        self.glyph_width = lru_cache(maxsize=None)(self._glyph_width)
+        self.line_width = lru_cache(maxsize=65536)(self._line_width)
+
+    def _glyph_width(self, ch):
+        try:
+            return self.glyph_widths[ch]
+        except KeyError:
+            try:
+                return len(ch.encode('shift-jis'))
+            except UnicodeEncodeError:
+                return 2
+
+    def _line_width(self, line):
+        if self._codes is not None:
+            line = self._codes.sub('', line)
+        return sum(map(self.glyph_width, line))
+
+    def lines(self, english):
+        """The lines of a translation, control codes and all."""
+        return self._breaks.split(_text(english))
+
+    def check(self, english):
+        """(line, kind, size, limit) for each way a translation doesn't fit."""
+        problems = []
+        lines = self.lines(english)
+        if self.line_length is not None:
+            for i, line in enumerate(lines):
+                width = self.line_width(line)
+                if width > self.line_length:
+                    problems.append((i + 1, 'width', width, self.line_length))
+        if self.window_lines is not None and len(lines) > self.window_lines:
+            problems.append((None, 'lines', len(lines), self.window_lines))
+        return problems
+
+    def check_store(self, store):
+        """Every Overflow in every translated row of a TranslationStore (DumpExcel, SQLiteStore...)."""
+        overflows = []
+        for sheet_name in store.sheetnames:
+            try:
+                rows = store.rows(sheet_name)
+            except ValueError:
+                # Not a dump sheet
+                continue
+            for row in rows:
+                if not row.english:
+                    continue
+                location = row.offset if row.offset is not None else row.cd_offset
+                english = row.english if row.prefix is None else row.prefix + row.english
+                for line, kind, size, limit in self.check(english):
+                    overflows.append(Overflow(sheet_name, row.filename, location, line, kind,
+                                              size, limit, _text(english)))
+        return overflows
+
+    def check_translations(self, translations):
+        """Overflows for a list of Translations (e.g. from get_translations)."""
+        overflows = []
+        for t in translations:
+            for line, kind, size, limit in self.check(t.english):
+                overflows.append(Overflow(None, _target_filename(t.gamefile), t.location, line, kind, size, limit, _text(t.english)))
+        return overflows
+
+
+def _target_filename(target):
+    """The filename of a Translation's target: a Block, a Gamefile or a filename."""
+    if hasattr(target, 'gamefile'):
+        return target.gamefile.filename
+    return getattr(target, 'filename', target)
+
+
+def load_rominfo(path):
+    """A rominfo.py (or any module with the same names) loaded from a path."""
+    spec = spec_from_file_location('rominfo', path)
+    module = module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def checker_from_rominfo(rominfo, glyph_widths=None):
+    return WidthChecker(getattr(rominfo, 'LINE_LENGTH', None),
+                        getattr(rominfo, 'WINDOW_LINES', None),
+                        getattr(rominfo, 'NEWLINE_CHAR', '\n'),
+                        getattr(rominfo, 'CONTROL_CODES', {}),
+                        glyph_widths or getattr(rominfo, 'GLYPH_WIDTHS', None))
+
+
+def report(overflows):
+    for o in overflows:
+        where = o.filename or o.sheet
+        loc = hex(o.location) if o.location is not None else '?'
+        if o.kind == 'width':
+            print("%s %s line %i: %s wide (max %s): %r" % (where, loc, o.line, o.size, o.limit, o.text))
+        else:
+            print("%s %s: %i lines (max %i): %r" % (where, loc, o.size, o.limit, o.text))
+    print("%i overflows" % len(overflows))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python checker.py dump.xlsx [rominfo.py] [glyph_widths.json]")
+        sys.exit(1)
+
+    from dump import DumpExcel
+
+    rominfo = load_rominfo(sys.argv[2] if len(sys.argv) > 2 else 'rominfo.py')
+    glyph_widths = None
+    if len(sys.argv) > 3:
+        with open(sys.argv[3], 'r', encoding='utf-8') as f:
+            glyph_widths = json.load(f)
+
+    checker = checker_from_rominfo(rominfo, glyph_widths)
+    store = DumpExcel(sys.argv[1], control_codes=getattr(rominfo, 'CONTROL_CODES', {}))
+    report(checker.check_store(store))
@@ -8,6 +8,7 @@ http://euee.web.fc2.com/tool/nd.html
 NDC version is Ver.0 alpha05d 2017/06/11.
 """
 import logging
+from collections import namedtuple
 from os import path, pardir, mkdir
 from shutil import copyfile
 from subprocess import check_output, CalledProcessError
@@ -237,6 +238,11 @@ class Disk:
         return self.filename
 
 
+# A pointer that verify_pointers() thinks is broken. problem is one of
+# 'out of range', 'not a string start' or 'text mismatch'.
+PointerMismatch = namedtuple('PointerMismatch', ['pointer', 'target', 'problem', 'found', 'expected'])
+
+
 class Gamefile(object):
     def __init__(self, path, disk=None, dest_disk=None, pointer_constant=0, pointer_sheet_name=None):
         self.path = path
@@ -386,6 +392,56 @@ class Gamefile(object):
                             print("Skipping this one to avoid double-edit")
 
 
+    def verify_pointers(self, translations=None, separator=b'\x00'):
+        """
+        Check every pointer against the edited filestring, for running after each build.
+        All pointer values get read in one numpy pass. Each target has to be
+        the start of a string (right after a separator). With translations,
+        the string there also has to be exactly the en_bytestring of the
+        translation whose location is the pointer's original text location.
+        Returns a list of PointerMismatch (empty if everything's fine).
+        """
+        if not self.pointers:
+            return []
+        # Only imported here, so pachy98 (which imports this module) doesn't need numpy.
+        import numpy as np
+        pointers = [p for ptrs in self.pointers.values() for p in ptrs]
+
+        data = np.frombuffer(self.filestring, dtype=np.uint8)
+        if len(data) < 2:
+            return [PointerMismatch(p, None, 'out of range', None, None) for p in pointers]
+        locations = np.array([p.location for p in pointers], dtype=np.int64)
+        constants = np.array([p.constant for p in pointers], dtype=np.int64)
+        readable = (locations >= 0) & (locations + 1 < len(data))
+        safe = np.where(readable, locations, 0)
+        values = data[safe].astype(np.int64) | (data[safe + 1].astype(np.int64) << 8)
+        targets = np.where(readable, values + constants, -1)
+
+        in_range = readable & (targets >= 0) & (targets < len(data))
+
+        expected = {}
+        for t in translations or []:
+            expected[t.location] = t.en_bytestring
+
+        mismatches = []
+        for p, target, ok_range in zip(pointers, targets.tolist(), in_range.tolist()):
+            if not ok_range:
+                mismatches.append(PointerMismatch(p, target, 'out of range', None, None))
+                continue
+            if target != 0 and self.filestring[target - len(separator):target] != separator:
+                mismatches.append(PointerMismatch(p, target, 'not a string start',
+                                                  self.filestring[max(target - len(separator), 0):target + 1],
+                                                  separator))
+                continue
+            intended = expected.get(p.original_text_location)
+            if intended is not None:
+                # The string has to end right there too, not just start with it.
+                end = target + len(intended)
+                found = self.filestring[target:end + len(separator)]
+                if found != intended + separator and not (found == intended and end == len(self.filestring)):
+                    mismatches.append(PointerMismatch(p, target, 'text mismatch', found, intended))
+        return mismatches
+
     def __repr__(self):
         return self.filename
 
@@ -1,6 +1,16 @@
+import re
+import numpy as np
 import xlsxwriter
-from collections import OrderedDict
+import pickle
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+from operator import attrgetter
+from os import stat, replace
 from openpyxl import load_workbook
+try:
+    from .utils import file_hash
+except ImportError:
+    from utils import file_hash
 
 SPECIAL_CHARACTERS = {
     'ō': '[o]',
@@ -26,6 +36,95 @@ def pack(h):
     return (s, t)
 
 
+# Names that never get decoded back from bytes (they'd match everywhere).
+DECODE_SKIP = (b'[BLANK]', '[BLANK]')
+
+
+def _as_type(kind, s):
+    """Convert a control code name/value to str or bytes, to match the string it's used on."""
+    if kind is bytes and isinstance(s, str):
+        return s.encode('shift-jis')
+    if kind is str and isinstance(s, (bytes, bytearray)):
+        return s.decode('shift-jis')
+    return s
+
+
+class ControlCodeTable(object):
+    """
+    A control code dict ({name: bytes}) compiled into one alternation regex per
+    direction, so a string gets all its codes replaced in one pass instead of
+    one replace() per code. Longer names win over shorter ones they start with.
+    Use ControlCodeTable.of(control_codes) to reuse the table for the same dict.
+    """
+    # Tables of the last few dicts used with of(), by id(). Each entry holds on
+    # to its dict, so the id can't be reused by another dict while it's cached.
+    # A table is a snapshot of its dict, so it only gets reused while the dict
+    # still has the same codes (a dict comparison, which is much cheaper than
+    # building a key out of the items on every call).
+    _tables = OrderedDict()
+    MAX_CACHED_TABLES = 16
+
+    def __init__(self, control_codes):
+        self.control_codes = dict(control_codes)
+        self._compiled = {}
+
+    @classmethod
+    def of(cls, control_codes):
+        if isinstance(control_codes, cls):
+            return control_codes
+        key = id(control_codes)
+        cached = cls._tables.get(key)
+        if cached is not None and cached[0] is control_codes and cached[1].control_codes == control_codes:
+            cls._tables.move_to_end(key)
+            return cached[1]
+        table = cls(control_codes)
+        cls._tables[key] = (control_codes, table)
+        if len(cls._tables) > cls.MAX_CACHED_TABLES:
+            cls._tables.popitem(last=False)
+        return table
+
+    def _pattern(self, direction, kind):
+        if (direction, kind) not in self._compiled:
+            if direction == 'encode':
+                pairs = self.control_codes.items()
+            else:
+                pairs = [(v, k) for k, v in self.control_codes.items() if k not in DECODE_SKIP]
+
+            mapping = {}
+            for old, new in pairs:
+                old, new = _as_type(kind, old), _as_type(kind, new)
+                # Several names can share the same bytes; the first one wins.
+                if old and old not in mapping:
+                    mapping[old] = new
+
+            if mapping:
+                alternation = sorted(mapping, key=len, reverse=True)
+                pattern = re.compile(_as_type(kind, '|').join(re.escape(a) for a in alternation))
+            else:
+                pattern = None
+            self._compiled[(direction, kind)] = (pattern, mapping)
+        return self._compiled[(direction, kind)]
+
+    def _sub(self, direction, s):
+        kind = str if isinstance(s, str) else bytes
+        pattern, mapping = self._pattern(direction, kind)
+        if pattern is None or not s:
+            return s
+        return pattern.sub(lambda m: mapping[m.group(0)], s)
+
+    def mapping(self, direction, kind=bytes):
+        """The {old: new} replacements that encode or decode ("direction") makes on str or bytes."""
+        return self._pattern(direction, kind)[1]
+
+    def encode(self, s):
+        """Replace control code names with their bytes."""
+        return self._sub('encode', s)
+
+    def decode(self, s):
+        """Replace control code bytes with their names."""
+        return self._sub('decode', s)
+
+
 def ascii_to_hex_string(eng, control_codes={}):
     """Returns a hex string of the ascii bytes of a given english string."""
     eng_bytestring = ""
@@ -38,13 +137,7 @@ def ascii_to_hex_string(eng, control_codes={}):
             # Tried to encode a fullwidth number. Encode it as sjis instead.
             eng = eng.encode('shift-jis')
 
-        eng_bytestring = eng
-
-        for cc in control_codes:
-            cc_hex = ascii_to_hex_string(cc)
-            if cc_hex in eng_bytestring:
-                eng_bytestring = eng_bytestring.replace(cc_hex, control_codes[cc])
-
+        eng_bytestring = ControlCodeTable.of(control_codes).encode(eng)
         return eng_bytestring
 
 
@@ -57,18 +150,21 @@ def sjis_to_hex_string(jp, control_codes={}):
         # Trying to encode numbers throws an attribute error; they aren't important, so just keep the number
         sjis = str(jp)
 
-    jp_bytestring = sjis
-
-    for cc in control_codes:
-        cc_hex = sjis_to_hex_string(cc)
-        if cc_hex in jp_bytestring:
-            jp_bytestring = jp_bytestring.replace(cc_hex, control_codes[cc])
-
+    jp_bytestring = ControlCodeTable.of(control_codes).encode(sjis)
     return jp_bytestring
 
 
 class Translation(object):
-    """Has an offset, a SJIS japanese string, and an ASCII english string."""
+    """
+    Has an offset, a SJIS japanese string, and an ASCII english string.
+    jp_bytestring/en_bytestring (the strings with control codes replaced) get
+    encoded the first time they're used, so loading a script just to look at
+    offsets or metadata doesn't pay for them.
+    """
+    __slots__ = ['location', 'cd_location', 'compressed_location', 'total_location', 'gamefile',
+                 'japanese', 'english', 'category', 'portrait', 'prefix', 'suffix', 'pointers', 'command',
+                 '_control_codes', '_jp_bytestring', '_en_bytestring']
+
     def __init__(self, gamefile, location, japanese, english, category=None, portrait=None,
                  prefix=None, suffix=None, command=None, cd_location=None, compressed_location=None, total_location=None, pointers=None,
                  control_codes={}):
@@ -85,9 +181,6 @@ class Translation(object):
             self.japanese = japanese
             self.english = english
 
-        self.jp_bytestring = self.japanese
-        self.en_bytestring = self.english
-
         self.category = category
         self.portrait = portrait
         self.prefix = prefix
@@ -95,12 +188,29 @@ class Translation(object):
         self.pointers = pointers
         self.command = command
 
-        for cc in control_codes:
-            if cc in self.jp_bytestring:
-                self.jp_bytestring = self.jp_bytestring.replace(cc, control_codes[cc])
-            if cc in self.en_bytestring:
-                self.en_bytestring = self.en_bytestring.replace(cc, control_codes[cc])
+        self._control_codes = ControlCodeTable.of(control_codes)
+        self._jp_bytestring = None
+        self._en_bytestring = None
+
+    @property
+    def jp_bytestring(self):
+        if self._jp_bytestring is None:
+            self._jp_bytestring = self._control_codes.encode(self.japanese)
+        return self._jp_bytestring
+
+    @jp_bytestring.setter
+    def jp_bytestring(self, value):
+        self._jp_bytestring = value
+
+    @property
+    def en_bytestring(self):
+        if self._en_bytestring is None:
+            self._en_bytestring = self._control_codes.encode(self.english)
+        return self._en_bytestring
 
+    @en_bytestring.setter
+    def en_bytestring(self, value):
+        self._en_bytestring = value
 
     def refresh_jp_bytestring(self):
         self.jp_bytestring = sjis_to_hex_string(self.japanese)
@@ -168,30 +278,12 @@ class BorlandPointer(object):
         self.value = "%s %s" % ('{0:02x}'.format(value_bytes[0]), '{0:02x}'.format(value_bytes[1]))
 
     def text(self, control_codes={}):
-        gamefile_slice = self.gamefile.filestring[self.text_location:self.text_location+30]
-        gamefile_slice = gamefile_slice.split(self.separator)[0]
-        
-        for cc in control_codes:
-            if cc == b'[BLANK]':
-                continue
-            gamefile_slice = gamefile_slice.replace(control_codes[cc], cc)
-
-        try:
-            gamefile_slice = gamefile_slice.decode('shift_jis')
-        except:
-            helpful_bytes = ' '.join(['{0:02x}'.format(b) for b in gamefile_slice])
-            gamefile_slice = helpful_bytes
-        return gamefile_slice
+        gamefile_slice = _string_at(self.gamefile.filestring, self.text_location, self.separator)
+        gamefile_slice = ControlCodeTable.of(control_codes).decode(gamefile_slice)
+        return _decode_or_hex(gamefile_slice)
 
     def original_text(self):
-        gamefile_slice = self.gamefile.original_filestring[self.text_location:self.text_location+45]
-        gamefile_slice = gamefile_slice.split('\x00')[0]
-        try:
-            gamefile_slice = gamefile_slice.decode('shift_jis')
-        except:
-            helpful_bytes = ' '.join(['{0:02x}'.format(b) for b in gamefile_slice])
-            gamefile_slice = helpful_bytes
-        return gamefile_slice
+        return _decode_or_hex(_string_at(self.gamefile.original_filestring, self.original_text_location, self.separator))
 
     def move_pointer_location(self, diff):
         self.location += diff
@@ -255,258 +347,421 @@ class BorlandPointer(object):
 class PossessionerPointer(BorlandPointer):
     pass
 
-class DumpExcel(object):
-    """
-    Takes a dump excel path, and lets you get a block's translations from it.
-    """
-    # TODO: Currently uses the order of the excel sheet. Might want to sort it by text_location in get_translations()...
 
-    def __init__(self, path, control_codes={}):
-        self.path = path
-        self.workbook = load_workbook(self.path)
-        self.control_codes = control_codes
+def _string_at(filestring, location, separator):
+    """The bytes from location up to (not including) the next separator."""
+    end = filestring.find(separator, location)
+    return filestring[location:end if end != -1 else len(filestring)]
 
-        #self.rows_with_file = {}
-        #print("About to cache rows with file")
-        #self._cache_rows_with_file()
 
+def _decode_or_hex(s):
+    try:
+        return s.decode('shift_jis')
+    except UnicodeDecodeError:
+        return ' '.join(['{0:02x}'.format(b) for b in s])
 
-    def get_translations(self, target, sheet_name=None, include_blank=False, use_cd_location=False):
-        """Get the translations for a file."""
-        # Accepts a block, gamefile, or filename as "target".
-        # If sheet_name is defined, the target will be the filenamne within that multi-file sheet.
-        trans = []    # translations[offset] = Translation()
 
-        if sheet_name:
-            worksheet = self.workbook.get_sheet_by_name(sheet_name)
-        else:
-            try:
-                worksheet = self.workbook.get_sheet_by_name(target.gamefile.filename)
-            except KeyError:
-                worksheet = self.workbook.get_sheet_by_name(target.gamefile.filename.lstrip('decompressed_').rstrip('.decompressed'))
-            except AttributeError:
-                try:
-                    worksheet = self.workbook.get_sheet_by_name(target.filename)
-                except AttributeError:
-                    worksheet = self.workbook.get_sheet_by_name(target)
+# One row of pointer_texts(): the pointer, the extent of the string it points to,
+# the raw bytes and the decoded text (control codes as names, or hex if it isn't SJIS).
+PointerText = namedtuple('PointerText', ['pointer', 'start', 'stop', 'bytestring', 'text'])
 
-        first_row = list(worksheet.rows)[0]
-        header_values = [t.value for t in first_row]
 
-        try:
-            offset_col = header_values.index('Offset (FD)')
-            cd_offset_col = header_values.index('Offset (CD)')
-            compressed_offset_col = None
-        except ValueError:
-            try:
-                offset_col = header_values.index('Offset')
-                cd_offset_col = None
-                compressed_offset_col = header_values.index('Compressed Offset')
-            except ValueError:
-                offset_col = header_values.index('Offset')
-                cd_offset_col = None
-                compressed_offset_col = None
+def pointer_texts(pointers, filestring=None, separator=b'\x00', control_codes={}, original=False):
+    """
+    The text of every pointer in a pointer table, in the same order.
+    "pointers" is a list of BorlandPointers or a Gamefile.pointers dict.
+    Every separator position in the file is found once, so each string gets
+    sliced to its exact length (no fixed-size window to truncate it), and all
+    of them go through one control code pass and one decode.
+    With original, the strings come from the gamefile's original_filestring,
+    at each pointer's original text location.
+    """
+    if isinstance(pointers, dict):
+        pointers = [p for ptrs in pointers.values() for p in ptrs]
+    if not pointers:
+        return []
+    if filestring is None:
+        gamefile = pointers[0].gamefile
+        filestring = gamefile.original_filestring if original else gamefile.filestring
+    filestring = bytes(filestring)
+
+    if len(separator) == 1:
+        separators = np.flatnonzero(np.frombuffer(filestring, dtype=np.uint8) == separator[0])
+    else:
+        separators = np.array([m.start() for m in re.finditer(re.escape(separator), filestring)], dtype=np.int64)
+    locations = [p.original_text_location if original else p.text_location for p in pointers]
+    starts = np.clip(np.array(locations, dtype=np.int64), 0, len(filestring))
+
+    # Each string stops at the first separator at or after its start.
+    separators = np.append(separators, len(filestring))
+    stops = separators[np.searchsorted(separators, starts)]
+    starts, stops = starts.tolist(), stops.tolist()
+    bytestrings = [filestring[a:b] for a, b in zip(starts, stops)]
+
+    table = ControlCodeTable.of(control_codes)
+    if any(separator in code for code in table.mapping('decode')):
+        # A code could match across two joined strings; do them one at a time.
+        decoded = [table.decode(b) for b in bytestrings]
+    else:
+        decoded = table.decode(separator.join(bytestrings)).split(separator)
 
-        jp_col = header_values.index('Japanese')
+    try:
+        texts = separator.join(decoded).decode('shift_jis').split(separator.decode('shift_jis'))
+    except UnicodeDecodeError:
+        texts = None
+    if texts is None or len(texts) != len(decoded):
+        # Something isn't SJIS (or a separator got eaten as a trail byte).
+        texts = [_decode_or_hex(d) for d in decoded]
 
-        # Appareden (and later games) have two (three?) English columns
-        try:
-            en_col = header_values.index('English (Typeset)')
-        except ValueError:
-            try:
-                en_col = header_values.index('English (Ingame)')
-            except ValueError:
-                en_col = header_values.index('English')
+    return [PointerText(p, a, b, bs, t) for p, a, b, bs, t in zip(pointers, starts, stops, bytestrings, texts)]
 
-        try:
-            filename_col = header_values.index('File')
-        except ValueError:
-            try:
-                filename_col = header_values.index('Filename')
-            except ValueError:
-                filename_col = None
 
-        # TODO: These more ad-hoc columns might do better in a dictionary or something.
+# One parsed row of a dump sheet. Offsets are ints (or None), japanese/english/prefix are
+# Shift JIS bytes, and english is None when the row hasn't been translated yet.
+DumpRow = namedtuple('DumpRow', ['filename', 'offset', 'cd_offset', 'compressed_offset', 'total_offset',
+                                 'japanese', 'english', 'category', 'portrait', 'prefix', 'suffix',
+                                 'command', 'pointers'])
 
-        try:
-            category_col = header_values.index('Category')
-        except ValueError:
-            category_col = None
+OFFSET_KINDS = ('offset', 'cd_offset', 'compressed_offset')
 
-        try:
-            portrait_col = header_values.index('Portrait')
-        except ValueError:
-            portrait_col = None
+# Parsed dump sheets get cached next to the xlsx. Bump the version whenever
+# DumpRow or parse_dump_rows changes, so old sidecars get ignored.
+SIDECAR_EXTENSION = '.idx'
+SIDECAR_VERSION = 1
 
-        try:
-            suffix_col = header_values.index("Suffix")
-        except ValueError:
-            suffix_col = None
 
+def _header_index(header_values, *names):
+    """Column of the first of these headers that the sheet has, or None."""
+    for name in names:
         try:
-            prefix_col = header_values.index('Ctrl Codes')
+            return header_values.index(name)
         except ValueError:
-            prefix_col = None
+            continue
+    return None
 
-        try:
-            command_col = header_values.index("Command")
-        except ValueError:
-            command_col = None
-
-        try:
-            pointer_col = header_values.index("Pointer")
-        except ValueError:
-            pointer_col = None
-
-        try:
-            total_offset_col = header_values.index("Offset (Total)")
-        except ValueError:
-            total_offset_col = None
 
-        for row in list(worksheet.rows)[1:]:  # Skip the first row, it's just labels
-            # Skip rows not for this block and file, if the target is a block
-            if filename_col is not None:
-                try:
-                    start, stop = target.start, target.stop
-                    if sheet_name and row[filename_col].value != target.gamefile.filename:
-                        continue
-                # Skip rows that aren't for this file, if a sheet name is specified
-                except AttributeError:
-                    if sheet_name and row[filename_col].value != target:
-                        continue
+def _hex_value(value):
+    try:
+        return int(value, 16)
+    except TypeError:
+        # Either a blank line or a total value. Ignore it.
+        return None
 
-            try:
-                offset = int(row[offset_col].value, 16)
-            except TypeError:
-                # Either a blank line or a total value. Ignore it.
-                offset = None
 
-            try:
-                cd_offset = int(row[cd_offset_col].value, 16)
-            except TypeError:
-                cd_offset = None
+def parse_dump_rows(rows):
+    """
+    Turns the rows of a dump sheet (sequences of cell values, header row first)
+    into DumpRows. Columns are looked up by header once, not once per query.
+    """
+    rows = iter(rows)
+    # (A StopIteration here would turn into a RuntimeError; this is a generator.)
+    header_values = next(rows, None)
+    if header_values is None:
+        raise ValueError("not a dump sheet")
+    header_values = list(header_values)
+
+    offset_col = _header_index(header_values, 'Offset (FD)', 'Offset')
+    cd_offset_col = _header_index(header_values, 'Offset (CD)')
+    compressed_offset_col = _header_index(header_values, 'Compressed Offset')
+    total_offset_col = _header_index(header_values, 'Offset (Total)')
+
+    jp_col = header_values.index('Japanese')
+    # Appareden (and later games) have two (three?) English columns
+    en_col = _header_index(header_values, 'English (Typeset)', 'English (Ingame)', 'English')
+    if en_col is None:
+        raise ValueError("'English' is not in list")
+
+    filename_col = _header_index(header_values, 'File', 'Filename')
+    category_col = _header_index(header_values, 'Category')
+    portrait_col = _header_index(header_values, 'Portrait')
+    suffix_col = _header_index(header_values, 'Suffix')
+    prefix_col = _header_index(header_values, 'Ctrl Codes')
+    command_col = _header_index(header_values, 'Command')
+    pointer_col = _header_index(header_values, 'Pointer')
+
+    for row in rows:
+        def value(col):
+            if col is None or col >= len(row):
+                return None
+            return row[col]
+
+        offset = _hex_value(value(offset_col))
+        cd_offset = _hex_value(value(cd_offset_col))
+        compressed_offset = _hex_value(value(compressed_offset_col))
+        total_offset = _hex_value(value(total_offset_col))
+
+        if offset is None and cd_offset is None and compressed_offset is None:
+            # Single-file sheets end at the first blank line. Multi-file sheets
+            # can have blank lines between files, so keep going. (Per-file
+            # queries always skipped those rows. Only whole-sheet queries of a
+            # multi-file sheet used to stop at the first one.)
+            if filename_col is None:
+                break
+            continue
 
-            try:
-                compressed_offset = int(row[compressed_offset_col].value, 16)
-            except TypeError:
-                compressed_offset = None
+        #for sc in SPECIAL_CHARACTERS:
+        #    japanese = japanese.replace(sc, SPECIAL_CHARACTERS[sc])
+        japanese = value(jp_col)
+        if japanese is None:
+            japanese = b""
+        else:
+            japanese = str(japanese).encode('shift-jis')
 
+        english = value(en_col)
+        if english is not None:
             try:
-                total_offset = int(row[total_offset_col].value, 16)
-            except TypeError:
-                total_offset = None
+                english = english.encode('shift-jis')
+            except AttributeError:   # Int column values
+                english = str(english).encode('shift-jis')
+            except UnicodeEncodeError:
+                print(value(offset_col))
+                for ch in SPECIAL_CHARACTERS:
+                    english = english.replace(ch, SPECIAL_CHARACTERS[ch])
+                english = english.encode('shift-jis')
+
+        # Prefix control codes, for (secret project) control code soup
+        prefix = value(prefix_col)
+        if prefix:
+            prefix = prefix.encode('shift-jis')
+        else:
+            prefix = None
+
+        # Pointer column, for Last Armageddon
+        pointers = value(pointer_col)
+        if pointers is not None:
+            pointers = [int(loc, 16) for loc in pointers.split("; ")]
+
+        yield DumpRow(filename=value(filename_col),
+                      offset=offset,
+                      cd_offset=cd_offset,
+                      compressed_offset=compressed_offset,
+                      total_offset=total_offset,
+                      japanese=japanese,
+                      english=english,
+                      category=value(category_col),      # Category, for Appareden equipment
+                      portrait=value(portrait_col),      # Portrait ID, for Appareden dialogue
+                      prefix=prefix,
+                      suffix=value(suffix_col),          # Suffix control codes, for Different Realm control code soup
+                      command=value(command_col),        # Command context, for (secret project) dialogue context
+                      pointers=pointers)
+
+
+class SheetIndex(object):
+    """
+    The parsed rows of one dump sheet. Each file's rows get sorted by an offset
+    column the first time it's queried, so block queries are bisect slices.
+    """
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.has_filenames = any(r.filename is not None for r in self.rows)
+        self._files = {None: self.rows}
+        if self.has_filenames:
+            for r in self.rows:
+                self._files.setdefault(r.filename, []).append(r)
+        self._sorted = {}
+
+    def rows_for_file(self, filename=None):
+        """All rows for a file (or the whole sheet), in sheet order."""
+        return self._files.get(filename, [])
+
+    def _sorted_rows(self, filename, kind):
+        key = (filename, kind)
+        if key not in self._sorted:
+            rows = [r for r in self.rows_for_file(filename) if getattr(r, kind) is not None]
+            rows.sort(key=attrgetter(kind))
+            self._sorted[key] = ([getattr(r, kind) for r in rows], rows)
+        return self._sorted[key]
+
+    def rows_in_range(self, start, stop, filename=None, kind='offset'):
+        """Rows with start <= offset < stop, sorted by offset. kind is one of OFFSET_KINDS."""
+        keys, rows = self._sorted_rows(filename, kind)
+        return rows[bisect_left(keys, start):bisect_left(keys, stop)]
+
+
+class TranslationStore(object):
+    """
+    Something translations can be looked up in: a dump xlsx, a SQLite db, CSVs...
+    Subclasses set sheetnames and implement sheet_index(), or override
+    has_filenames() and rows() to answer queries some other way.
+    """
+    sheetnames = []
 
-            if offset is None and cd_offset is None and compressed_offset is None:
-                break
+    def __init__(self, control_codes={}):
+        self.control_codes = control_codes
 
+    def sheet_index(self, sheet_name):
+        raise NotImplementedError
+
+    def has_filenames(self, sheet_name):
+        """Whether a sheet has a File column, i.e. is a multi-file sheet."""
+        return self.sheet_index(sheet_name).has_filenames
+
+    def rows(self, sheet_name, filename=None, start=None, stop=None, kind='offset'):
+        """
+        DumpRows of a sheet (or of one file in a multi-file sheet). With start
+        and stop, just the rows with start <= kind < stop, sorted by kind.
+        Otherwise, all of them in sheet order.
+        """
+        index = self.sheet_index(sheet_name)
+        if start is None:
+            return index.rows_for_file(filename)
+        return index.rows_in_range(start, stop, filename, kind)
+
+    def _target_sheet_name(self, target):
+        try:
+            sheet_name = target.gamefile.filename
+            if sheet_name not in self.sheetnames:
+                sheet_name = sheet_name.lstrip('decompressed_').rstrip('.decompressed')
+            return sheet_name
+        except AttributeError:
             try:
-                start, stop = target.start, target.stop
-                #print(start, stop)
-                if use_cd_location:
-                    offset = cd_offset
-                if offset is None:
-                    continue
-                if not (target.start <= offset < target.stop):
-                    continue
+                return target.filename
             except AttributeError:
-                pass
-            #print("Made it this far")
+                return target
 
-            if row[en_col].value is None and not include_blank:
-                continue
-            #print(sheet_name)
-            #for sc in SPECIAL_CHARACTERS:
-            #    japanese = japanese.replace(sc, SPECIAL_CHARACTERS[sc])
-            #japanese = japanese.encode('shift-jis')
-            if row[jp_col].value is None:
-                japanese = b""
-            else:
-                japanese = row[jp_col].value.encode('shift-jis')
-            #print(japanese)
-            #print(row[en_col].value)
-            if row[en_col].value is None:
-                english = b""
-            else:
+    def get_translations(self, target, sheet_name=None, include_blank=False, use_cd_location=False):
+        """Get the translations for a file."""
+        # Accepts a block, gamefile, or filename as "target".
+        # If sheet_name is defined, the target will be the filenamne within that multi-file sheet.
+        filename = None
+        if sheet_name:
+            if self.has_filenames(sheet_name):
                 try:
-                    english = row[en_col].value.encode('shift-jis')
-                except AttributeError:   # Int column values
-                    
-                    english = str(row[en_col].value).encode('shift-jis')
-                except UnicodeEncodeError:
-                    print(hex(offset))
-                    english = row[en_col].value
-                    for ch in SPECIAL_CHARACTERS:
-                        english = english.replace(ch, SPECIAL_CHARACTERS[ch])
-                    english = english.encode('shift-jis')
-
-            # Category, for Appareden equipment
-            if category_col is not None:
-                category = row[category_col].value
-            else:
-                category = None
-
-            # Portrait ID, for Appareden dialogue
-            if portrait_col is not None:
-                portrait = row[portrait_col].value
-            else:
-                portrait = None
+                    filename = target.gamefile.filename
+                except AttributeError:
+                    filename = getattr(target, 'filename', target)
+        else:
+            sheet_name = self._target_sheet_name(target)
 
-            # Suffix control codes, for Different Realm control code soup
-            if suffix_col is not None:
-                suffix = row[suffix_col].value
-            else:
-                suffix = None
-
-            # Prefix control codes, for (secret project) control code soup
-            if prefix_col is not None:
-                if row[prefix_col].value:
-                    prefix = row[prefix_col].value.encode('shift-jis')
-                else:
-                    prefix = None
-            else:
-                prefix = None
+        try:
+            start, stop = target.start, target.stop
+        except AttributeError:
+            is_block = False
+            rows = self.rows(sheet_name, filename)
+        else:
+            is_block = True
+            kind = 'cd_offset' if use_cd_location else 'offset'
+            rows = self.rows(sheet_name, filename, start, stop, kind)
+
+        control_codes = ControlCodeTable.of(self.control_codes)
+        trans = []
+        for row in rows:
+            if row.english is None and not include_blank:
+                continue
 
-            # Command context, for (secret project) dialogue context
-            if command_col is not None:
-                command = row[command_col].value
+            if is_block and use_cd_location:
+                location = row.cd_offset
             else:
-                command = None
-
-            # Pointer column, for Last Armageddon
-            if pointer_col is not None:
-                if row[pointer_col].value is not None:
-                    pointers = [int(loc, 16) for loc in row[pointer_col].value.split("; ")]
-                else:
-                    pointers = None
-            else:
-                pointers=None
-
-
-            # if isinstance(japanese, long):
-            #    # Causes some encoding problems? Trying to skip them for now
-            #    continue
+                location = row.offset
 
             # Blank strings are None (non-iterable), so use "" instead.
-            if not english:
-                english = b""
-
-            trans.append(Translation(target, offset, japanese, english,
-                                     category=category, portrait=portrait,
-                                     control_codes=self.control_codes,
-                                     cd_location=cd_offset, compressed_location=compressed_offset, total_location=total_offset,
-                                     suffix=suffix, prefix=prefix, 
-                                     command=command, pointers=pointers
+            english = row.english or b""
+
+            trans.append(Translation(target, location, row.japanese, english,
+                                     category=row.category, portrait=row.portrait,
+                                     control_codes=control_codes,
+                                     cd_location=row.cd_offset, compressed_location=row.compressed_offset,
+                                     total_location=row.total_offset,
+                                     suffix=row.suffix, prefix=row.prefix,
+                                     command=row.command, pointers=row.pointers
                                      ))
         return trans
 
 
+class DumpExcel(TranslationStore):
+    """
+    Takes a dump excel path, and lets you get a block's translations from it.
+
+    The parsed rows of every sheet get pickled to a sidecar file next to the
+    xlsx (path + SIDECAR_EXTENSION). Later loads read that instead, and only
+    open the workbook with openpyxl once the xlsx's size, mtime or hash change.
+    Without the sidecar, each sheet is parsed the first time it's queried.
+    """
+    def __init__(self, path, control_codes={}, use_sidecar=True):
+        super(DumpExcel, self).__init__(control_codes)
+        self.path = path
+        self.sidecar_path = path + SIDECAR_EXTENSION
+        self._workbook = None
+        self._indexes = {}
+
+        if not use_sidecar:
+            self.sheetnames = self.workbook.sheetnames
+        elif not self._load_sidecar():
+            self.sheetnames = self.workbook.sheetnames
+            for sheet_name in self.sheetnames:
+                try:
+                    self.sheet_index(sheet_name)
+                except Exception:
+                    # Not a dump sheet (notes, etc.), or a broken one. It gets
+                    # parsed again (and raises) only if it's ever queried.
+                    continue
+            # Everything is parsed, so let go of the file handle.
+            self.close()
+            self._write_sidecar()
+
+    @property
+    def workbook(self):
+        # Read-only mode streams rows from the file instead of building every
+        # cell object up front, so memory doesn't grow with the sheet.
+        if self._workbook is None:
+            self._workbook = load_workbook(self.path, read_only=True, data_only=True)
+        return self._workbook
+
+    def close(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
+    def _sidecar_key(self):
+        st = stat(self.path)
+        return (SIDECAR_VERSION, st.st_size, st.st_mtime_ns, file_hash(self.path))
+
+    def _load_sidecar(self):
+        try:
+            with open(self.sidecar_path, 'rb') as f:
+                key, sheetnames, sheets = pickle.load(f)
+        except (IOError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return False
+        if key != self._sidecar_key():
+            return False
+        self.sheetnames = sheetnames
+        # Rows are pickled as plain tuples, so the sidecar doesn't depend on
+        # whether this module was imported as "dump" or "romtools.dump".
+        self._indexes = {name: SheetIndex(DumpRow(*r) for r in rows)
+                         for name, rows in sheets.items()}
+        return True
+
+    def _write_sidecar(self):
+        sheets = {name: [tuple(r) for r in index.rows]
+                  for name, index in self._indexes.items()}
+        tmp_path = self.sidecar_path + '.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump((self._sidecar_key(), self.sheetnames, sheets), f,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            replace(tmp_path, self.sidecar_path)
+        except (IOError, OSError):
+            print("Couldn't write the dump cache %s, continuing without it" % self.sidecar_path)
+
+    def sheet_index(self, sheet_name):
+        """The SheetIndex of a sheet. Each sheet is only parsed once."""
+        if sheet_name not in self._indexes:
+            worksheet = self.workbook[sheet_name]
+            rows = worksheet.iter_rows(values_only=True)
+            self._indexes[sheet_name] = SheetIndex(parse_dump_rows(rows))
+        return self._indexes[sheet_name]
+
+
 class PointerExcel(object):
-    def __init__(self, path):
+    def __init__(self, path, constant_memory=False):
+        # constant_memory only matters when creating a new pointer sheet.
+        # It keeps memory flat for huge pointer dumps, but then each sheet's
+        # rows have to be written top to bottom.
         self.path = path
         try:
-            self.workbook = load_workbook(self.path)
+            self.workbook = load_workbook(self.path, read_only=True, data_only=True)
         except IOError:
-            self.workbook = xlsxwriter.Workbook(self.path)
+            self.workbook = xlsxwriter.Workbook(self.path, {'constant_memory': constant_memory})
 
     def add_worksheet(self, title):
         self.worksheet = self.workbook.add_worksheet(title)
@@ -539,13 +794,14 @@ class PointerExcel(object):
             print("Workbook object is not subscriptable...?")
             return pointers
 
-        for i, row in enumerate(ws):
-            if i == 0:
+        for row in ws.iter_rows(min_row=2, values_only=True):
+            if not row or row[0] is None:
+                # Read-only sheets can end with empty rows.
                 continue
-            text_location = int(row[0].value, 16)
+            text_location = int(row[0], 16)
             try:
-                pointer_location = int(row[1].value, 16)
-            except ValueError:
+                pointer_location = int(row[1], 16)
+            except (IndexError, TypeError, ValueError):
                 print("Pointer with text location %s had no pointer location. Proceed with caution" % hex(text_location))
                 continue
             ptr = BorlandPointer(gamefile, pointer_location, text_location)
@@ -1,11 +1,22 @@
 """
-    Generic dumper of Shift-JIS text into an excel spreadsheet.
+    Generic dumper of Shift-JIS text into an excel spreadsheet (or CSV/JSONL).
     Meant for quick estimations of how much text is in a game.
 """
 
 import sys
 import os
-import xlsxwriter
+import re
+import shutil
+import tempfile
+import numpy as np
+from collections import Counter, deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+try:
+    from .disk import Disk, is_valid_disk_image
+    from .writers import open_dump_writer
+except ImportError:
+    from disk import Disk, is_valid_disk_image
+    from writers import open_dump_writer
 
 COMPILER_MESSAGES = [b'Turbo', b'Borland', b'C++', b'Library', b'Copyright']
 
@@ -16,112 +27,292 @@ ASCII_MODE = 0
 
 THRESHOLD = 4
 
+# Strings further apart than this aren't in the same block.
+BLOCK_GAP = 0x40
 
-def dump(files):
-    worksheet = workbook.add_worksheet('Everything')
-    worksheet.write(0, 0, 'Offset', header)
-    worksheet.write(0, 1, 'Japanese', header)
-    worksheet.write(0, 2, 'File', header)
-    worksheet.write(0, 3, 'Comments', header)
-
-    worksheet.set_column('A:A', 8)
-    worksheet.set_column('B:B', 60)
-    worksheet.set_column('C:C', 15)
-    worksheet.set_column('D:D', 60)
-    row = 1
-    for filename in files:
-        if filename.endswith('CGX') or filename.endswith('.SEL'):
+ROMINFO_SKELETON = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rominfo.py')
+
+
+def sjis_runs(contents, start=0, ascii_mode=ASCII_MODE):
+    """
+    Returns (offset, bytes) for every continuous run of SJIS text in
+    contents[start:] (and ASCII text, depending on ascii_mode).
+    Every byte gets classified in one numpy pass instead of a Python loop:
+    a position starts a SJIS character if it's a lead byte followed by a
+    valid trail byte. Runs of those starts are read two bytes at a time, so
+    an odd-length run also swallows the byte after it as its last trail byte.
+    """
+    data = np.frombuffer(contents, dtype=np.uint8)[start:]
+    n = len(data)
+    if n == 0:
+        return []
+
+    lead = ((data >= 0x81) & (data <= 0x9f)) | ((data >= 0xe0) & (data <= 0xef))
+    trail = ((data >= 0x40) & (data <= 0x7e)) | ((data >= 0x80) & (data <= 0xfc))
+    pair = np.zeros(n, dtype=bool)
+    pair[:-1] = lead[:-1] & trail[1:]
+
+    text = pair.copy()
+    if ascii_mode in (1, 2):
+        text |= (data >= 0x20) & (data <= 0x7e)
+
+    edges = np.diff(pair.astype(np.int8), prepend=0, append=0)
+    pair_starts, pair_stops = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    # pair[n-1] is always False, so a stop is never past the end.
+    text[pair_stops[(pair_stops - pair_starts) % 2 == 1]] = True
+
+    edges = np.diff(text.astype(np.int8), prepend=0, append=0)
+    starts, stops = np.flatnonzero(edges == 1) + start, np.flatnonzero(edges == -1) + start
+    return [(a, contents[a:b]) for a, b in zip(starts.tolist(), stops.tolist())]
+
+
+def skip_file(filename):
+    return filename.endswith('CGX') or filename.endswith('.SEL')
+
+
+def find_strings(contents):
+    """(offset, length, japanese) for every string in a file that looks worth translating."""
+    # Skip everything before the compiler's copyright message, if there is one
+    start = 0
+    for c in COMPILER_MESSAGES:
+        if c in contents:
+            start = contents.index(c)
+            break
+
+    strings = []
+    for offset, sjis in sjis_runs(contents, start):
+        if len(sjis) < THRESHOLD:
             continue
 
-        with open(os.path.join(rom_contents_dir, filename), 'rb') as f:
-            contents = f.read()
-
-            cursor = 0
-            sjis_buffer = b""
-            sjis_buffer_start = 0
-            sjis_strings = []
-
-            for c in COMPILER_MESSAGES:
-                print(c)
-                if c in contents:
-                    #print(contents)
-                    cursor = contents.index(c)
-                    sjis_buffer_start = contents.index(c)
-                    break
-
-            while cursor < len(contents):
-
-                # First byte of SJIS text. Read the next one, too
-                if (0x80 <= contents[cursor] <= 0x9f or 0xe0 <= contents[cursor] <= 0xef) and cursor+1 < len(contents):
-                    #print(bytes(contents[cursor]))
-                    sjis_buffer += contents[cursor].to_bytes(1, byteorder='little')
-                    cursor += 1
-                    sjis_buffer += contents[cursor].to_bytes(1, byteorder='little')
-
-                # ASCII text
-                elif 0x20 <=contents[cursor] <= 0x7e and ASCII_MODE in (1, 2):
-                    sjis_buffer += contents[cursor].to_bytes(1, byteorder='little')
-
-                # C string formatting with %
-                #elif contents[cursor] == 0x25:
-                #    #sjis_buffer += b'%'
-                #    cursor += 1
-                #    if contents[cursor]
-
-                # End of continuous SJIS string, so add the buffer to the strings and reset buffer
-                else:
-                    sjis_strings.append((sjis_buffer_start, sjis_buffer))
-                    sjis_buffer = b""
-                    sjis_buffer_start = cursor+1
-                cursor += 1
-                #print(sjis_buffer)
-
-            # Catch anything left after exiting the loop
-            if sjis_buffer:
-                sjis_strings.append((sjis_buffer_start, sjis_buffer))
-
-
-            if len(sjis_strings) == 0:
+        try:
+            jp = sjis.decode('shift-jis')
+        except UnicodeDecodeError:
+            print("Couldn't decode that")
+            continue
+
+        if len(jp.strip()) == 0:
+            continue
+        strings.append((offset, len(sjis), jp))
+    return strings
+
+
+def detect_blocks(contents, spans, max_gap=BLOCK_GAP):
+    """
+    Group (offset, length) string spans, sorted by offset, into text blocks.
+    The file's separator is the byte that most often comes right after a
+    string. Two neighboring strings are in the same block if the gap between
+    them is at most max_gap bytes of separators and printable ASCII (control
+    codes, format strings); any other byte means code or data in between.
+    Returns (start, stop) tuples, with stop just past the last separator.
+    """
+    if not spans:
+        return []
+    data = np.frombuffer(contents, dtype=np.uint8)
+    offsets = np.array([o for o, _ in spans], dtype=np.int64)
+    ends = offsets + np.array([l for _, l in spans], dtype=np.int64)
+
+    followers = data[ends[ends < len(data)]]
+    separator = int(np.bincount(followers).argmax()) if len(followers) else None
+
+    # bad_before[i]: how many bytes before i can't be inside a block
+    allowed = (data >= 0x20) & (data <= 0x7e)
+    if separator is not None:
+        allowed |= data == separator
+    bad_before = np.concatenate(([0], np.cumsum(~allowed)))
+
+    gaps = offsets[1:] - ends[:-1]
+    clean = bad_before[offsets[1:]] - bad_before[ends[:-1]] == 0
+    breaks = np.flatnonzero((gaps > max_gap) | ~clean) + 1
+
+    blocks = []
+    for first, last in zip(np.concatenate(([0], breaks)), np.concatenate((breaks, [len(spans)])) - 1):
+        stop = int(ends[last])
+        if separator is not None and stop < len(data) and data[stop] == separator:
+            stop += 1
+        blocks.append((int(offsets[first]), stop))
+    return blocks
+
+
+def scan_file(filepath):
+    """The strings in a file, and the text blocks they make up."""
+    with open(filepath, 'rb') as f:
+        contents = f.read()
+    strings = find_strings(contents)
+    return strings, detect_blocks(contents, [(o, l) for o, l, _ in strings])
+
+
+def rominfo_names(keys):
+    """
+    {(disk, path in disk): name to use in rominfo}. Files go by their
+    filename, like rominfo expects, unless another file has the same one;
+    then by their path, or by disk:path if that's taken too.
+    """
+    keys = list(keys)
+    filenames = Counter(p.split('/')[-1] for _, p in keys)
+    paths = Counter(p for _, p in keys)
+    names = OrderedDict()
+    for disk, p in keys:
+        if filenames[p.split('/')[-1]] == 1:
+            names[(disk, p)] = p.split('/')[-1]
+        elif paths[p] == 1:
+            names[(disk, p)] = p
+        else:
+            names[(disk, p)] = '%s:%s' % (disk, p)
+    return names
+
+
+def write_rominfo(path, file_blocks):
+    """
+    Write a copy of the rominfo.py skeleton with FILE_BLOCKS, DISKS and
+    FILES_TO_PATCH filled in.
+    file_blocks: {(disk, path in disk): [(start, stop), ...]}, in disk order.
+    Paths use "/" between directories.
+    """
+    with open(ROMINFO_SKELETON, 'r', encoding='utf-8') as f:
+        skeleton = f.read()
+
+    file_blocks = OrderedDict((k, v) for k, v in file_blocks.items() if v)
+    names = rominfo_names(file_blocks)
+
+    lines = ['FILE_BLOCKS = {']
+    files_to_patch = OrderedDict()
+    for key, blocks in file_blocks.items():
+        lines.append("    %r: [" % names[key])
+        for start, stop in blocks:
+            lines.append("        (0x%x, 0x%x)," % (start, stop))
+        lines.append("    ],")
+        files_to_patch.setdefault(key[0], []).append(names[key])
+    lines.append('}')
+
+    disks = list(files_to_patch)
+    patch_lines = ['FILES_TO_PATCH = {']
+    for d in disks:
+        patch_lines.append("    %r: %r," % (d, files_to_patch[d]))
+    patch_lines.append('}')
+
+    for name, value in (('FILE_BLOCKS', '\n'.join(lines)),
+                        ('DISKS', 'DISKS = %r' % disks),
+                        ('FILES_TO_PATCH', '\n'.join(patch_lines))):
+        skeleton = re.sub(r'^%s = .*$' % name, lambda m: value, skeleton, count=1, flags=re.M)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(skeleton)
+
+
+def extract_disk(disk_path, dest_dir, ndc_dir=''):
+    """
+    Extract every file in a disk image to dest_dir through NDC.
+    Yields (path in disk, extracted path) as each one is done.
+    """
+    disk = Disk(disk_path, ndc_dir=ndc_dir)
+    for dirpath, dirnames, filenames in disk.ndc.walk(disk.filename):
+        dest = os.path.join(dest_dir, dirpath)
+        if not os.path.isdir(dest):
+            os.makedirs(dest)
+        for filename in filenames:
+            if skip_file(filename):
                 continue
+            disk.ndc.get(disk.filename, os.path.join(dirpath, filename), dest)
+            yield os.path.join(dirpath, filename), os.path.join(dest, filename)
+
 
-            for s in sjis_strings:
-                if len(s[1]) < THRESHOLD:
-                    continue
+def dump(files, output_path, disk_column=False, rominfo_path=None):
+    """
+    Dump files, an iterable of (disk, name, path) tuples, into one sheet
+    (or CSV/JSONL file, depending on output_path's extension).
+    Each file gets submitted to a process pool as soon as it comes out of
+    the iterable (so scanning overlaps with extracting them from a disk).
+    Rows are written in file order, as soon as each file is done.
+    With rominfo_path, the detected text blocks get written to a rominfo.py
+    skeleton there too.
+    """
+    file_blocks = OrderedDict()
+    columns = ['Offset', 'Japanese', 'File']
+    widths = [8, 60, 15]
+    if disk_column:
+        columns.append('Disk')
+        widths.append(15)
+    columns.append('Comments')
+    widths.append(60)
 
-                loc = '0x' + hex(s[0]).lstrip('0x').zfill(5)
-                try:
-                    jp = s[1].decode('shift-jis')
-                except UnicodeDecodeError:
-                    print("Couldn't decode that")
-                    continue
+    with open_dump_writer(output_path, columns, widths) as writer:
 
-                if len(jp.strip()) == 0:
-                    continue
+        def write_rows(disk, name, scan):
+            strings, blocks = scan.result()
+            filename = os.path.basename(name)
+            if blocks:
+                # Same-named files in other directories or disks stay apart.
+                file_blocks.setdefault((disk, name.replace(os.sep, '/')), []).extend(blocks)
+            for offset, _, jp in strings:
+                loc = '0x%05x' % offset
                 print(loc, jp)
+                row = [loc, jp, filename]
+                if disk_column:
+                    row.append(disk)
+                writer.write_row(row)
+
+        pending = deque()
+        with ProcessPoolExecutor() as pool:
+            for disk, name, filepath in files:
+                pending.append((disk, name, pool.submit(scan_file, filepath)))
+                while pending and pending[0][2].done():
+                    write_rows(*pending.popleft())
+            while pending:
+                write_rows(*pending.popleft())
+
+    if rominfo_path:
+        write_rominfo(rominfo_path, file_blocks)
+        print("Wrote block skeleton to %s" % rominfo_path)
 
-                worksheet.write(row, 0, loc)
-                worksheet.write(row, 1, jp)
-                worksheet.write(row, 2, filename)
-                row += 1
 
-    workbook.close()
+def dump_disks(disk_paths, output_path, ndc_dir='', rominfo_path=None):
+    """Dump every file in a set of disk images into one sheet with a Disk column."""
+    tmp_dir = tempfile.mkdtemp()
+
+    def disk_files():
+        for i, disk_path in enumerate(disk_paths):
+            print("Extracting files from %s..." % disk_path)
+            disk_name = os.path.splitext(os.path.basename(disk_path))[0]
+            for name, filepath in extract_disk(disk_path, os.path.join(tmp_dir, str(i)), ndc_dir):
+                yield disk_name, name, filepath
+
+    try:
+        dump(disk_files(), output_path, disk_column=True, rominfo_path=rominfo_path)
+    finally:
+        shutil.rmtree(tmp_dir)
+
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print("Usage: python dumper.py folderwithgamefilesinit")
+    args = sys.argv[1:]
+    output_path = None
+    rominfo_path = None
+    for a in list(args):
+        if a.startswith('--output='):
+            output_path = a.split('=', 1)[1]
+            args.remove(a)
+        elif a.startswith('--rominfo='):
+            rominfo_path = a.split('=', 1)[1]
+            args.remove(a)
+
+    if len(args) < 1:
+        print("Usage: python dumper.py [--output=dump.xlsx|.csv|.tsv|.jsonl] [--rominfo=rominfo.py] folderwithgamefilesinit")
+        print("       python dumper.py [--output=...] [--rominfo=...] disk1.fdi [disk2.fdi ...]")
         sys.exit(1)
-    rom_contents_dir = sys.argv[1]
-    workbook = xlsxwriter.Workbook(rom_contents_dir + '_dump.xlsx')
-    header = workbook.add_format({'bold': True, 'align': 'center', 'bottom': True, 'bg_color': 'gray'})
-    FILES = [f for f in os.listdir(rom_contents_dir) if os.path.isfile(os.path.join(rom_contents_dir, f))]
-    print(FILES)
-    dump(FILES)
 
+    if all(os.path.isfile(a) and is_valid_disk_image(a) for a in args):
+        output_path = output_path or os.path.splitext(args[0])[0] + '_dump.xlsx'
+        rominfo_path = rominfo_path or os.path.splitext(output_path)[0] + '_rominfo.py'
+        dump_disks(args, output_path, rominfo_path=rominfo_path)
+    else:
+        rom_contents_dir = args[0]
+        output_path = output_path or rom_contents_dir + '_dump.xlsx'
+        rominfo_path = rominfo_path or os.path.splitext(output_path)[0] + '_rominfo.py'
+        FILES = [f for f in os.listdir(rom_contents_dir)
+                 if os.path.isfile(os.path.join(rom_contents_dir, f)) and not skip_file(f)]
+        print(FILES)
+        disk_name = os.path.basename(os.path.normpath(rom_contents_dir))
+        dump([(disk_name, f, os.path.join(rom_contents_dir, f)) for f in FILES],
+             output_path, rominfo_path=rominfo_path)
 
-# TODO: It'd be even better if it just took a disk, or a bunch of disks, and used ndc to get files.
-# TODO: Column for disks
 
 # TODO: Export the dump to a google doc as well?
-
-# TODO: Detect blocks and export that to a skeleton rominfo.py file.
-    # (That could help with detecting some of the one-string-only "blocks" in code sections.)
@@ -0,0 +1,186 @@
+"""
+Translation memory: every distinct Japanese string in a dump, with all the
+places it occurs. Games repeat a lot of strings across their EXEs and data
+files, so translators can work on the memory sheet (one row per string)
+instead of the full dump, and a translation entered once fans out to every
+row that has the same Japanese.
+
+    memory = TranslationMemory(DumpExcel(DUMP_XLS_PATH))
+    memory.write('memory.xlsx')       # one row per unique string
+    ...translate memory.xlsx...
+    memory.load('memory.xlsx')
+    translations = memory.get_translations(gamefile)
+
+TranslationMemory is itself a TranslationStore. Rows that are blank in the
+dump get the memory's translation; rows with their own English keep it, so
+context-specific translations of a common string still work. Encoded
+bytestrings are cached per unique string, so duplicates only get encoded once.
+"""
+
+import csv
+import json
+from collections import OrderedDict
+from os.path import splitext
+from openpyxl import load_workbook
+try:
+    from .dump import ControlCodeTable, TranslationStore
+    from .writers import open_dump_writer
+except ImportError:
+    from dump import ControlCodeTable, TranslationStore
+    from writers import open_dump_writer
+
+MEMORY_COLUMNS = ['Japanese', 'English', 'Count', 'Locations']
+MEMORY_WIDTHS = [60, 60, 8, 60]
+
+
+class MemoryEntry(object):
+    """One distinct Japanese string, its translation and where it occurs."""
+    __slots__ = ['japanese', 'english', 'occurrences']
+
+    def __init__(self, japanese, english=None):
+        self.japanese = japanese
+        self.english = english
+        # (sheet name, DumpRow) pairs
+        self.occurrences = []
+
+    def locations(self):
+        """Each occurrence as "FILE 0x1234", for the Locations column."""
+        locs = []
+        for sheet_name, row in self.occurrences:
+            offset = row.offset if row.offset is not None else row.cd_offset
+            locs.append("%s 0x%05x" % (row.filename or sheet_name, offset or 0))
+        return locs
+
+    def translations(self):
+        """Every distinct English the dump has for this string."""
+        return list(OrderedDict.fromkeys(r.english for _, r in self.occurrences if r.english is not None))
+
+    def __repr__(self):
+        return "%s x%i" % (self.japanese.decode('shift-jis', 'replace'), len(self.occurrences))
+
+
+class TranslationMemory(TranslationStore):
+    def __init__(self, store, control_codes=None):
+        if control_codes is None:
+            control_codes = store.control_codes
+        super(TranslationMemory, self).__init__(control_codes)
+        self.store = store
+        self.sheetnames = []
+        self.entries = OrderedDict()
+        self._encoded = {}
+
+        for sheet_name in store.sheetnames:
+            try:
+                rows = store.rows(sheet_name)
+            except ValueError:
+                # Not a dump sheet
+                continue
+            self.sheetnames.append(sheet_name)
+            for row in rows:
+                if not row.japanese:
+                    continue
+                entry = self.entries.get(row.japanese)
+                if entry is None:
+                    entry = self.entries[row.japanese] = MemoryEntry(row.japanese, row.english)
+                elif entry.english is None:
+                    entry.english = row.english
+                entry.occurrences.append((sheet_name, row))
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, japanese):
+        return self.entries[japanese]
+
+    def duplicates(self):
+        """Entries that occur more than once."""
+        return [e for e in self.entries.values() if len(e.occurrences) > 1]
+
+    def conflicts(self):
+        """Entries whose occurrences have been translated differently."""
+        return [e for e in self.entries.values() if len(e.translations()) > 1]
+
+    def write(self, path):
+        """One row per unique string. The format depends on the extension (see writers.py)."""
+        with open_dump_writer(path, MEMORY_COLUMNS, MEMORY_WIDTHS, sheet_name='Memory') as writer:
+            for entry in self.entries.values():
+                english = entry.english.decode('shift-jis') if entry.english is not None else None
+                writer.write_row([entry.japanese.decode('shift-jis'), english,
+                                  len(entry.occurrences), '; '.join(entry.locations())])
+
+    def load(self, path):
+        """
+        Read translations back from a memory sheet written by write().
+        Returns how many entries got a new translation.
+        """
+        changed = 0
+        for japanese, english in _read_memory(path):
+            if japanese is None:
+                continue
+            entry = self.entries.get(str(japanese).encode('shift-jis'))
+            if entry is None:
+                continue
+            english = str(english).encode('shift-jis') if english not in (None, '') else None
+            if english != entry.english:
+                entry.english = english
+                changed += 1
+        self._encoded.clear()
+        return changed
+
+    def has_filenames(self, sheet_name):
+        return self.store.has_filenames(sheet_name)
+
+    def rows(self, sheet_name, filename=None, start=None, stop=None, kind='offset'):
+        rows = self.store.rows(sheet_name, filename, start, stop, kind)
+        filled = []
+        for row in rows:
+            if row.english is None:
+                entry = self.entries.get(row.japanese)
+                if entry is not None and entry.english is not None:
+                    row = row._replace(english=entry.english)
+            filled.append(row)
+        return filled
+
+    def encode(self, s):
+        """Control codes replaced, cached per distinct string."""
+        try:
+            return self._encoded[s]
+        except KeyError:
+            encoded = self._encoded[s] = ControlCodeTable.of(self.control_codes).encode(s)
+            return encoded
+
+    def get_translations(self, target, sheet_name=None, include_blank=False, use_cd_location=False):
+        trans = super(TranslationMemory, self).get_translations(target, sheet_name, include_blank, use_cd_location)
+        for t in trans:
+            t.jp_bytestring = self.encode(t.japanese)
+            t.en_bytestring = self.encode(t.english)
+        return trans
+
+
+def _read_memory(path):
+    """(japanese, english) cell values of a memory sheet in any of the writers.py formats."""
+    extension = splitext(path)[1].lower()
+    if extension == '.xlsx':
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook['Memory'].iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return
+            header = list(header)
+            jp_col, en_col = header.index('Japanese'), header.index('English')
+            for row in rows:
+                yield row[jp_col], row[en_col]
+        finally:
+            workbook.close()
+    elif extension == '.jsonl':
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    yield row.get('Japanese'), row.get('English')
+    else:
+        delimiter = ',' if extension == '.csv' else '\t'
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f, delimiter=delimiter):
+                yield row['Japanese'], row['English']
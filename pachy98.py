@@ -5,7 +5,7 @@
 
 from tqdm import tqdm
 import sys
-import filecmp
+import struct
 import logging
 import json
 import jsonschema
@@ -15,6 +15,7 @@ from os import (
     mkdir,
     walk,
     remove,
+    replace,
     getcwd,
     chdir,
     access,
@@ -29,10 +30,14 @@ from shutil import (
 from os.path import (
     isfile,
     isdir,
+    relpath,
+    sep,
     split as pathsplit,
     join as pathjoin,
 )
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import freeze_support
 from disk import (
     Disk,
     HARD_DISK_FORMATS,
@@ -41,7 +46,10 @@ from disk import (
     FileNotFoundError,
     FileFormatNotSupportedError,
 )
-from patch import Patch, PatchChecksumError
+from fat import FATImage, FATError
+from patch import Patch, PatchChecksumError, PROFILES, benchmark
+from bundle import BUNDLE_FILENAME, BundleError, PatchBundle, bundle_dir
+from utils import file_hash
 from urllib.request import urlopen
 from urllib.error import HTTPError, URLError
 
@@ -116,6 +124,13 @@ class Config:
 
         self.patch_dir = pathjoin(pathsplit(json_path)[0], 'patch')
 
+        # A patch.bundle next to the config replaces the patch folder.
+        # It only gets opened (and hashed) once it's needed for patching.
+        self.bundle_path = pathjoin(pathsplit(json_path)[0], BUNDLE_FILENAME)
+        if not isfile(self.bundle_path):
+            self.bundle_path = None
+        self._bundle = None
+
         # Validate with jsonschema.
         try:
             jsonschema.validate(self.json, self.SCHEMA)
@@ -149,12 +164,49 @@ class Config:
     def __get_files(self, image):
         return image.get('files', [])
 
-    def __validate_path(self, filename):
+    @property
+    def bundle(self):
+        """The verified PatchBundle, or None if there isn't one."""
+        if self._bundle is None and self.bundle_path is not None:
+            try:
+                self._bundle = PatchBundle(self.bundle_path)
+            except BundleError as e:
+                message_wait_close("%s. Download the patch again." % e)
+            if not self._bundle.verify():
+                message_wait_close("%s is corrupted. Download the patch again." % self.bundle_path)
+        return self._bundle
+
+    def close(self):
+        if self._bundle is not None:
+            self._bundle.close()
+            self._bundle = None
+
+    def __bundle_names(self):
+        """Just the names in the bundle's index, without hashing it."""
+        try:
+            with PatchBundle(self.bundle_path) as bundle:
+                return set(bundle.names())
+        except BundleError as e:
+            message_wait_close("%s. Download the patch again." % e)
+
+    def __validate_path(self, filename, bundle_names=None):
+        if bundle_names is not None:
+            if filename not in bundle_names:
+                raise FileNotFoundError("%s in %s" % (filename, self.bundle_path))
+            return
         path = pathjoin(self.patch_dir, filename)
         if not isfile(path):
             raise FileNotFoundError(path)
 
+    def patch(self, original, patch, edited, xdelta_dir):
+        """A Patch for a patch filename, from the bundle if there is one."""
+        if self.bundle is not None:
+            return Patch(original, patch, edited=edited, xdelta_dir=xdelta_dir,
+                         data=self.bundle.get(patch))
+        return Patch(original, pathjoin(exe_dir, 'patch', patch), edited=edited, xdelta_dir=xdelta_dir)
+
     def __validate_patch_existence(self):
+        bundle_names = self.__bundle_names() if self.bundle_path is not None else None
         for image in self.images:
             floppy_image = image.get('floppy', {})
             hdd_image = image.get('hdd', {})
@@ -167,22 +219,110 @@ class Config:
                 elif isinstance(patch, dict):
                     if patch['type'] == 'list':
                         for filename in list:
-                            self.__validate_path(filename)
+                            self.__validate_path(filename, bundle_names)
                     elif patch['type'] == 'boolean':
-                        self.__validate_path(patch['true'])
-                        self.__validate_path(patch['false'])
+                        self.__validate_path(patch['true'], bundle_names)
+                        self.__validate_path(patch['false'], bundle_names)
                 else:
                     # Interprets "type" as a string index if it has no type
                     # field.  This is the case for the normal generic patch.
-                    self.__validate_path(patch)
+                    self.__validate_path(patch, bundle_names)
+            if 'image_patch' in image:
+                self.__validate_path(image['image_patch'], bundle_names)
         return True
 
 
-def generate_config(disks):
+def disk_file_hashes(disk_path, extract_folder):
+    """
+    {path in disk: sha1} of every file in a disk image, and the folder the
+    files are in. Reads the image's FAT directly if fat.py understands it
+    (the folder is None then); otherwise extracts everything with NDC.
+    """
+    try:
+        with FATImage(disk_path) as image:
+            return image.file_hashes(), None
+    except FATError as e:
+        logging.info("Reading %s with NDC: %s" % (disk_path, e))
+
+    disk = Disk(disk_path, ndc_dir=bin_dir)
+    mkdir(extract_folder)
+    # TODO: It seems like extract() won't work here. May need to do something silly with walk(), or list()?
+    # (Or might just need to investigate further with ndcpy)
+    # NDC itself should work fine, but maybe walk() doesn't look at subdirs when called with extract()?
+    disk.ndc.extract(disk_path, extract_folder)
+    hashes = OrderedDict()
+    for root, dirs, files in walk(extract_folder):
+        for f in files:
+            full_path = pathjoin(root, f)
+            hashes[relpath(full_path, extract_folder).replace(sep, '/')] = file_hash(full_path)
+    return hashes, extract_folder
+
+
+def copy_disk_file(disk_path, files_folder, path_in_disk, dest):
+    """Put one file from a disk image at dest, from the FAT or from an NDC extraction folder."""
+    if files_folder is not None:
+        copyfile(pathjoin(files_folder, *path_in_disk.split('/')), dest)
+        return
+    with FATImage(disk_path) as image, open(dest, 'wb') as f:
+        f.write(image.read(path_in_disk))
+
+
+def write_in_place(disk_path, path_in_disk, file_path):
+    """
+    Write a patched file over the original's clusters, if it's still the same
+    size, without NDC. Returns whether it did; if not, it has to be inserted.
+    """
+    try:
+        with FATImage(disk_path, writable=True) as image:
+            path = image.resolve(pathsplit(file_path)[-1], path_in_disk)
+            if path is None or image.entries()[path].size != stat(file_path).st_size:
+                return False
+            with open(file_path, 'rb') as f:
+                written = image.write_in_place(path, f.read())
+            logging.info("Wrote %i changed bytes of %s in place" % (written, path))
+            return True
+    except (FATError, OSError, KeyError, IndexError, ValueError, struct.error) as e:
+        # A FAT or directory fat.py can't make sense of. NDC gets to try it.
+        logging.info("Can't write %s in place: %s" % (file_path, e))
+        return False
+
+
+def patch_name(path_in_disk):
+    """Patch filename for a file in a disk: its whole path, so same-named files in other folders don't clash."""
+    return path_in_disk.replace('/', '_') + '.xdelta'
+
+
+def reserve_patch_names(names, used_patch_names):
+    """Add names to used_patch_names. Returns the first one that was already taken, or None."""
+    for name in names:
+        if name in used_patch_names:
+            return name
+        used_patch_names.add(name)
+    return None
+
+
+def create_patch(original_file, patch_destination, patched_file, xdelta_dir, profile='default'):
+    Patch(original_file, patch_destination, edited=patched_file, xdelta_dir=xdelta_dir).create(profile)
+    return patch_destination
+
+
+def print_benchmark(totals):
+    print("%-10s %12s %10s %10s" % ('Profile', 'Patch size', 'Encode', 'Decode'))
+    for profile, (size, encode_time, decode_time, error) in totals.items():
+        if error:
+            print("%-10s %s" % (profile, error))
+        else:
+            print("%-10s %12i %9.2fs %9.2fs" % (profile, size, encode_time, decode_time))
+
+
+def generate_config(disks, profile='default', run_benchmark=False):
     # disks is a list of filenames: [o1, o2, p1, p2]. o is original, p is patched
     #  Need an even number of disks.
     if len(disks) % 2 != 0 or len(disks) < 2:
-        message_wait_close("Usage: pachy98.exe -generate disk1-orig.fdi disk2-orig.fdi disk1-patched.fdi disk2-patched.fdi")
+        message_wait_close("Usage: pachy98.exe -generate [-profile=%s] [-benchmark] "
+                           "disk1-orig.fdi disk2-orig.fdi disk1-patched.fdi disk2-patched.fdi" % '|'.join(PROFILES))
+    if profile not in PROFILES:
+        message_wait_close("Unknown profile %s. Choose one of: %s" % (profile, ', '.join(PROFILES)))
 
     disks = [pathjoin(exe_dir, d) for d in disks]
     for d in disks:
@@ -212,75 +352,123 @@ def generate_config(disks):
             ('images', []),
         ])
 
+    if not isdir('patch'):
+        mkdir('patch')
 
-    for disk_index in range(len(disks)//2):
-        print("Extracting files from %s..." % original_disks[disk_index])
-        o = original_disks[disk_index]
-        disk = Disk(o, ndc_dir=bin_dir)
-        original_folder = pathsplit(o)[-1].split('.')[0] + "-original"
-        mkdir(original_folder)
+    # Patch filenames so far, across all the disks
+    used_patch_names = set()
 
-        # TODO: It seems like extract() won't work here. May need to do something silly with walk(), or list()?
-        # (Or might just need to investigate further with ndcpy)
-        # NDC itself should work fine, but maybe walk() doesn't look at subdirs when called with extract()?
-        disk.ndc.extract(o, original_folder)
+    # profile: [total patch size, encode time, decode time, error]
+    benchmark_totals = OrderedDict((p, [0, 0, 0, None]) for p in PROFILES)
 
-        print("Extracting files from %s..." % patched_disks[disk_index])
-        p = patched_disks[disk_index]
-        disk = Disk(p, ndc_dir=bin_dir)
-        patched_folder = pathsplit(p)[-1].split('.')[0] + "-patched"
-        mkdir(patched_folder)
-        disk.ndc.extract(p, patched_folder)
+    # Patches get made in parallel while the next disks are being read.
+    with ProcessPoolExecutor() as pool:
+        for disk_index in range(len(disks)//2):
+            o = original_disks[disk_index]
+            p = patched_disks[disk_index]
+            original_folder = pathsplit(o)[-1].split('.')[0] + "-original"
+            patched_folder = pathsplit(p)[-1].split('.')[0] + "-patched"
 
-        patched_files = []
+            print("Hashing files in %s..." % o)
+            original_hashes, original_files = disk_file_hashes(o, original_folder)
+            print("Hashing files in %s..." % p)
+            patched_hashes, patched_files_folder = disk_file_hashes(p, patched_folder)
 
-        print("Comparing files in %s and %s..." % (original_disks[disk_index], patched_disks[disk_index]))
-        for root, dirs, files in walk(original_folder):
-            patched_root = root.replace(original_folder, patched_folder)
-            for f in files:
-                original_file = pathjoin(root, f)
-                patched_file = pathjoin(patched_root, f)
-                if not filecmp.cmp(original_file, patched_file, shallow=False):
-                    #print(original_file, "is different from", patched_file)
-                    patched_files.append(f)
-                    patch_filename = f + '.xdelta'
-                    if not isdir('patch'):
-                        mkdir('patch')
-                    patch_destination = pathjoin('patch', patch_filename)
-                    filepatch = Patch(original_file, patch_destination, edited=patched_file, xdelta_dir=bin_dir)
-                    filepatch.create()
-
-        if disk.extension in HARD_DISK_FORMATS:
-            disk_type = 'hdd'
-        else:
-            disk_type = 'floppy'
+            print("Comparing files in %s and %s..." % (o, p))
+            differing = [path_in_disk for path_in_disk, h in original_hashes.items()
+                         if path_in_disk in patched_hashes and patched_hashes[path_in_disk] != h]
 
-        file_field = []
-        for f in patched_files:
-            file_field.append(OrderedDict([
-                    ('name', f),
-                    ('patch', f + '.xdelta')
+            disk_type = 'floppy'
+            if pathsplit(p)[-1].split('.')[-1].lower() in HARD_DISK_FORMATS:
+                disk_type = 'hdd'
+
+            # Floppy dumps tend to be identical everywhere, so they also get
+            # a patch for the whole image. (Everyone's HDD is different.)
+            image_patch = None
+            if disk_type == 'floppy':
+                image_patch = pathsplit(o)[-1] + '.xdelta'
+
+            patch_names = [patch_name(d) for d in differing]
+            duplicate = reserve_patch_names(patch_names + ([image_patch] if image_patch else []),
+                                            used_patch_names)
+            if duplicate is not None:
+                message_wait_close("Two patches would both be called %s." % duplicate)
+
+            # Only the files that differ get extracted.
+            work_folder = pathsplit(o)[-1].split('.')[0] + "-generate"
+            mkdir(work_folder)
+            patch_jobs = []
+            for i, path_in_disk in enumerate(differing):
+                f = path_in_disk.split('/')[-1]
+                original_file = pathjoin(work_folder, '%i-original-%s' % (i, f))
+                patched_file = pathjoin(work_folder, '%i-patched-%s' % (i, f))
+                copy_disk_file(o, original_files, path_in_disk, original_file)
+                copy_disk_file(p, patched_files_folder, path_in_disk, patched_file)
+                patch_destination = pathjoin('patch', patch_names[i])
+                patch_jobs.append(pool.submit(create_patch, original_file, patch_destination, patched_file,
+                                              bin_dir, profile))
+
+            if image_patch is not None:
+                patch_jobs.append(pool.submit(create_patch, o, pathjoin('patch', image_patch), p,
+                                              bin_dir, profile))
+
+            file_field = []
+            for path_in_disk, name in zip(differing, patch_names):
+                f = path_in_disk.split('/')[-1]
+                file_field.append(OrderedDict([
+                        ('name', f),
+                        ('patch', name),
+                        ('source_hashes', OrderedDict([(name, original_hashes[path_in_disk])])),
+                        ('target_hashes', OrderedDict([(name, patched_hashes[path_in_disk])])),
+                    ]))
+
+            config['images'].append(OrderedDict([
+                    ('name', 'Disk %s' % disk_index),
+                    ('id', disk_index),
+                    ('type', disk_type),
                 ]))
+            # Whole-image hashes only make sense for floppies; every HDD
+            # install is different, and hashing one takes a while.
+            if disk_type == 'floppy':
+                config['images'][disk_index]['target_hash'] = file_hash(p)
+            if image_patch is not None:
+                config['images'][disk_index]['source_hash'] = file_hash(o)
+                config['images'][disk_index]['image_patch'] = image_patch
+
+            config['images'][disk_index][disk_type] = OrderedDict([
+                ('files', file_field)
+            ])
+
+            for job in patch_jobs:
+                print("Created %s" % job.result())
+
+            if run_benchmark and differing:
+                print("Benchmarking encoder profiles on %i files..." % len(differing))
+                pairs = [(pathjoin(work_folder, '%i-original-%s' % (i, d.split('/')[-1])),
+                          pathjoin(work_folder, '%i-patched-%s' % (i, d.split('/')[-1])))
+                         for i, d in enumerate(differing)]
+                for result in benchmark(pairs, work_folder, xdelta_dir=bin_dir):
+                    totals = benchmark_totals[result.profile]
+                    if result.error:
+                        totals[3] = result.error
+                    else:
+                        totals[0] += result.size
+                        totals[1] += result.encode_time
+                        totals[2] += result.decode_time
 
-        config['images'].append(OrderedDict([
-                ('name', 'Disk %s' % disk_index),
-                ('id', disk_index),
-                ('type', disk_type),
-            ]))
-
-        config['images'][disk_index][disk_type] = OrderedDict([
-            ('files', file_field)
-        ])
-
-        # Cleanup
-        print("Cleaning up...");
-        rmtree(original_folder)
-        rmtree(patched_folder)
+            # Cleanup
+            print("Cleaning up...");
+            for folder in (original_folder, patched_folder, work_folder):
+                if isdir(folder):
+                    rmtree(folder)
 
     print("Generating config %s..." % config_filename)
     with open(config_filename, 'w') as f:
         json.dump(config, f, indent=2)
 
+    if run_benchmark:
+        print_benchmark(benchmark_totals)
+
     print("All done.")
 
 
@@ -332,11 +520,11 @@ def select_config():
         for f in listdir(exe_dir)
         if f.startswith('Pachy98-') and f.endswith('.json')
     ]
+    # (path, game name) of each config that loads
     good_configs = []
     for c in configs:
         try:
-            Config(c)
-            good_configs.append(c)
+            good_configs.append((c, Config(c).info['game']))
         except json.decoder.JSONDecodeError:
             print("Invalid config")
             logging.info("Config %s is invalid, and was skipped" % c)
@@ -345,14 +533,13 @@ def select_config():
         message_wait_close('No "Pachy98-*.json" config files were found in this directory.')
 
     elif len(good_configs) == 1:
-        selected_config = good_configs[0]
+        selected_config = good_configs[0][0]
 
     elif len(configs) > 1:
         print("Multiple Pachy98 json config files found. "
               "Which game do you want to patch?")
-        for i, c in enumerate(good_configs):
-            cfg = Config(c)
-            print("%i) %s" % (i + 1, cfg.info['game']))
+        for i, (c, game) in enumerate(good_configs):
+            print("%i) %s" % (i + 1, game))
         config_choice = 0
         while config_choice not in range(1, len(good_configs) + 1):
             print("Enter a number %i-%i." % (1, len(good_configs)))
@@ -360,7 +547,7 @@ def select_config():
                 config_choice = int(input_catch_keyboard_interrupt(">"))
             except ValueError:  # int() on a string: try again
                 pass
-        selected_config = good_configs[config_choice - 1]
+        selected_config = good_configs[config_choice - 1][0]
     return selected_config
 
 
@@ -400,12 +587,92 @@ def patch_image(id, image):
     pass
 
 
+def patch_list_for(f):
+    """The patches to try on a file, in order, given the chosen options."""
+    if 'type' in f['patch']:
+        if f['patch']['type'] == 'failsafelist':
+            return f['patch']['list']
+        elif f['patch']['type'] == 'boolean':
+            if options[f['patch']['id']]:
+                return [f['patch']['true']]
+            else:
+                return [f['patch']['false']]
+        return []
+    return [f['patch']]
+
+
+def is_file_patched(file_path, f, patch_list):
+    """
+    Whether a file already matches what one of its patches would make it,
+    going by the config's "target_hashes" ({patch filename: sha1}).
+    """
+    target_hashes = f.get('target_hashes', {})
+    targets = set(target_hashes[p] for p in patch_list if p in target_hashes)
+    return bool(targets) and file_hash(file_path) in targets
+
+
+def is_image_patched(disk_path, image, image_hash=None):
+    """Whether a whole disk image is already the patched one, going by the config's "target_hash"."""
+    target_hash = image.get('target_hash')
+    return target_hash is not None and (image_hash or file_hash(disk_path)) == target_hash
+
+
+def image_patch_applies(image, image_hash):
+    """
+    Whether an image can take the config's whole-image patch: it's the exact
+    dump the patch was made from ("source_hash"), and no option changes which
+    file patches get used.
+    """
+    if 'image_patch' not in image or image.get('source_hash') != image_hash:
+        return False
+    files = image.get('floppy', image.get('hdd', {})).get('files', [])
+    return not any(isinstance(f.get('patch'), dict) and f['patch'].get('type') == 'boolean'
+                   for f in files)
+
+
+def patch_whole_image(disk_path, image, cfg, xdelta_dir):
+    """Apply an image's image_patch. Returns whether it worked; the image is untouched if it didn't."""
+    edited = disk_path + '_edited'
+    try:
+        cfg.patch(disk_path, image['image_patch'], edited, xdelta_dir).apply()
+        if image.get('target_hash') not in (None, file_hash(edited)):
+            raise PatchChecksumError('Patched image had incorrect checksum', [])
+    except PatchChecksumError:
+        if isfile(edited):
+            remove(edited)
+        return False
+    replace(edited, disk_path)
+    return True
+
+
+def insert_new_files(DiskImage, cfg, disk_directory, path_in_disk=''):
+    """Insert the files the config adds to the disk, from the bundle or the patch folder."""
+    for f in cfg.new_files:
+        print("Inserting new file %s..." % f['name'])
+        if cfg.bundle is not None and f['name'] in cfg.bundle:
+            new_file_path = pathjoin(disk_directory, f['name'])
+            with open(new_file_path, 'wb') as new_file:
+                new_file.write(cfg.bundle.get(f['name']))
+            DiskImage.insert(new_file_path, path_in_disk, delete_original=False)
+            remove(new_file_path)
+        else:
+            new_file_path = pathjoin(exe_dir, 'patch', f['name'])
+            DiskImage.insert(new_file_path, path_in_disk, delete_original=False)
+
+
 def patch_images(selected_images, cfg):
     backup_directory = pathjoin(exe_dir, 'backup')
     bin_dir = pathjoin(exe_dir, 'bin')
 
     for i, disk_path in enumerate(selected_images):
         image = cfg.images[i]
+        image_hash = None
+        if 'target_hash' in image or 'source_hash' in image:
+            image_hash = file_hash(disk_path)
+        if is_image_patched(disk_path, image, image_hash):
+            print("%s is already patched. Skipping it." % disk_path)
+            continue
+
         disk_directory = pathsplit(disk_path)[0]
         DiskImage = Disk(disk_path, backup_folder=backup_directory,
                          ndc_dir=bin_dir)
@@ -421,11 +688,21 @@ def patch_images(selected_images, cfg):
         except PermissionError:
             message_wait_close('Can\'t access the file "%s". Make sure the file is not in use.' % disk_path)
 
+        # A known dump gets one patch for the whole image instead of file by file.
+        if image_patch_applies(image, image_hash):
+            print("Patching %s with %s..." % (disk_path, image['image_patch']))
+            if patch_whole_image(disk_path, image, cfg, bin_dir):
+                insert_new_files(DiskImage, cfg, disk_directory)
+                continue
+            print("The image patch didn't work. Patching the files one by one...")
+
         if DiskImage.extension in HARD_DISK_FORMATS:
             files = image['hdd']['files']
         else:
             files = image['floppy']['files']
 
+        # Files that were already patched or got written in place; they don't get reinserted.
+        already_patched = set()
         for f in files:
             # Ignore files that lack a patch
             try:
@@ -456,29 +733,26 @@ def patch_images(selected_images, cfg):
                         DiskImage.restore_from_backup()
                         message_wait_close("Couldn't access the disk. Make sure it is not open in EditDisk/ND, and try again.")
                 extracted_file_path = pathjoin(disk_directory, f['name'])
-                copyfile(extracted_file_path, extracted_file_path + '_edited')
 
                 # Failsafe list. Patches to try in order.
-                patch_list = []
-                if 'type' in f['patch']:
-                    if f['patch']['type'] == 'failsafelist':
-                        patch_list = f['patch']['list']
-                    elif f['patch']['type'] == 'boolean':
-                        if options[f['patch']['id']]:
-                            patch_list = [f['patch']['true']]
-                        else:
-                            patch_list = [f['patch']['false']]
-                else:
-                    patch_list = [f['patch']]
+                patch_list = patch_list_for(f)
+
+                if is_file_patched(extracted_file_path, f, patch_list):
+                    print("%s is already patched. Skipping it." % f['name'])
+                    remove(extracted_file_path)
+                    already_patched.add(f['name'])
+                    patch_worked = True
+                    break
+
+                copyfile(extracted_file_path, extracted_file_path + '_edited')
 
                 # patch_worked = False
                 for i, patch in enumerate(patch_list):
-                    patch_filepath = pathjoin(exe_dir, 'patch', patch)
-                    patchfile = Patch(
+                    patchfile = cfg.patch(
                         extracted_file_path,
-                        patch_filepath,
-                        edited=extracted_file_path + '_edited',
-                        xdelta_dir=bin_dir)
+                        patch,
+                        extracted_file_path + '_edited',
+                        bin_dir)
                     try:
                         print("Patching %s with patch (%i) %s..." % (f['name'], i, patch))
                         patchfile.apply()
@@ -490,6 +764,9 @@ def patch_images(selected_images, cfg):
                 if not patch_worked and j < len(paths_in_disk) - 1:
                     print("Trying another file with the name %s..." % f['name'])
 
+            if f['name'] in already_patched:
+                continue
+
             if not patch_worked:
                 if 'optional' in f.keys():
                     if f['optional']:
@@ -509,6 +786,13 @@ def patch_images(selected_images, cfg):
                     message_wait_close("Patch checksum error. This disk is not compatible with this patch, or is already patched.")
 
             copyfile(extracted_file_path + '_edited', extracted_file_path)
+            if write_in_place(disk_path, path_in_disk, extracted_file_path):
+                print("Wrote %s in place." % f['name'])
+                already_patched.add(f['name'])
+                remove(extracted_file_path)
+                remove(extracted_file_path + '_edited')
+                continue
+
             if not options['delete_all_first']:
                 print("Inserting %s..." % f['name'])
                 try:
@@ -521,6 +805,7 @@ def patch_images(selected_images, cfg):
                 remove(extracted_file_path + '_edited')
 
         if options['delete_all_first']:
+            files = [f for f in files if f['name'] not in already_patched]
             for f in files:
                 try:
                     print("Deleting %s..." % f['name'])
@@ -541,13 +826,13 @@ def patch_images(selected_images, cfg):
                 remove(extracted_file_path)
                 remove(extracted_file_path + '_edited')
 
-        for f in cfg.new_files:
-            new_file_path = pathjoin(exe_dir, 'patch', f['name'])
-            print("Inserting new file %s..." % f['name'])
-            DiskImage.insert(new_file_path, path_in_disk, delete_original=False)
+        insert_new_files(DiskImage, cfg, disk_directory, path_in_disk)
 
 
 if __name__ == '__main__':
+    # Needed for the -generate process pool in a PyInstaller exe.
+    freeze_support()
+
     # Set the current directory to the working directory used by PyInstaller apps, if necessary.
     exe_dir = getcwd()
     if hasattr(sys, '_MEIPASS'):
@@ -559,8 +844,21 @@ if __name__ == '__main__':
     # Check args for a json-generating command
     if len(sys.argv) > 1:
         if sys.argv[1] == "-generate":
-            generate_config(sys.argv[2:])
+            # pachy98.exe -generate [-profile=small] [-benchmark] disks...
+            generate_args = [a for a in sys.argv[2:] if not a.startswith('-')]
+            profile = 'default'
+            for a in sys.argv[2:]:
+                if a.startswith('-profile='):
+                    profile = a.split('=', 1)[1]
+            generate_config(generate_args, profile=profile, run_benchmark='-benchmark' in sys.argv[2:])
             message_wait_close("")
+        elif sys.argv[1] == "-bundle":
+            # pachy98.exe -bundle [patch_dir] [bundle_path]
+            patch_dir = pathjoin(exe_dir, sys.argv[2] if len(sys.argv) > 2 else 'patch')
+            bundle_path = pathjoin(exe_dir, sys.argv[3] if len(sys.argv) > 3 else BUNDLE_FILENAME)
+            print("Bundling the patches in %s into %s..." % (patch_dir, bundle_path))
+            bundle_dir(patch_dir, bundle_path)
+            message_wait_close("All done.")
 
     # Setup log
     logging.basicConfig(filename=pathjoin(exe_dir, 'pachy98-log.txt'),
@@ -789,27 +1087,20 @@ if __name__ == '__main__':
                 continue
 
             f_path = pathjoin(exe_dir, plain_files_dir, f['name'])
+            patch_list = patch_list_for(f)
+            if is_file_patched(f_path, f, patch_list):
+                print("%s is already patched. Skipping it." % f['name'])
+                continue
+
             # Patch fhe files without doing any extracting stuff, but still consider options!
             print("Backing up %s..." % f['name'])
             copyfile(f_path, pathjoin(backup_directory, f['name']))
             copyfile(f_path, f['name'] + '_edited')
-            patch_list = []
-            if 'type' in f['patch']:
-                if f['patch']['type'] == 'failsafelist':
-                    patch_list = f['patch']['list']
-                elif f['patch']['type'] == 'boolean':
-                    if options[f['patch']['id']]:
-                        patch_list = [f['patch']['true']]
-                    else:
-                        patch_list = [f['patch']['false']]
-            else:
-                patch_list = [f['patch']]
 
             # NOTE: In a failsafelist, at least one patch has to work - not just the final one
             patch_worked = False
             for i, patch in enumerate(patch_list):
-                patch_filepath = pathjoin(exe_dir, 'patch', patch)
-                patchfile = Patch(f_path, patch_filepath, edited=f['name'] + '_edited', xdelta_dir=bin_dir)
+                patchfile = cfg.patch(f_path, patch, f['name'] + '_edited', bin_dir)
                 try:
                     print("Patching %s with patch (%i) %s..." % (f['name'], i, patch))
                     patchfile.apply()
@@ -838,4 +1129,5 @@ if __name__ == '__main__':
                 message_wait_close("Permission error. Make sure the file %s is not read-only or open somewhere." % f_path)
             remove(f['name'] + '_edited')
 
+    cfg.close()
     message_wait_close("Patching complete! Read the README and enjoy the game.")
@@ -2,9 +2,30 @@
 Utils for creating xdelta patches.
 """
 import logging
-from subprocess import check_output, CalledProcessError
+from collections import OrderedDict, namedtuple
+from subprocess import check_output, run, CalledProcessError, PIPE
 from shutil import copyfile
 from os import remove, path
+from time import perf_counter
+try:
+    from .utils import file_hash
+except ImportError:
+    from utils import file_hash
+
+# xdelta3 encoder options for Patch.create. -1..-9 is the compression level,
+# -S the secondary compressor and -B the source window (bigger finds matches
+# further apart in big files, at the cost of memory).
+# "smallest" needs an xdelta3 built with liblzma.
+PROFILES = OrderedDict([
+    ('default', []),
+    ('fast', ['-1']),
+    ('small', ['-9', '-S', 'djw']),
+    ('smallest', ['-9', '-S', 'lzma', '-B', str(64 * 1024 * 1024)]),
+])
+
+# One row of benchmark(). size is the total of all the patches; times are in
+# seconds. error is set (and the rest None) if the profile didn't work.
+BenchmarkResult = namedtuple('BenchmarkResult', ['profile', 'size', 'encode_time', 'decode_time', 'error'])
 
 
 class PatchChecksumError(Exception):
@@ -15,21 +36,27 @@ class PatchChecksumError(Exception):
 class Patch:
     # TODO: Abstract out the need for "edited" by just copying the original
     # file.
-    def __init__(self, original, filename, edited=None, xdelta_dir='.'):
+    def __init__(self, original, filename, edited=None, xdelta_dir='.', data=None):
         self.original = original
         self.edited = edited
         self.filename = filename
+        # The patch itself, if it isn't a file (e.g. a slice of a PatchBundle).
+        # It gets piped to xdelta3 instead of being read from "filename".
+        self.data = data
 
         # Need to have this absolute path for xdelta3 to be found.
         self.xdelta_path = path.join(xdelta_dir, 'xdelta3')
         # self.xdelta_path = 'xdelta3'
 
-    def create(self):
+    def create(self, profile='default'):
         if self.edited is None:
             raise Exception
+        if profile not in PROFILES:
+            raise ValueError("Unknown profile %s (one of %s)" % (profile, ', '.join(PROFILES)))
         cmd = [
             self.xdelta_path,
             '-f',
+        ] + PROFILES[profile] + [
             '-s',
             self.original,
             self.edited,
@@ -37,31 +64,79 @@ class Patch:
         ]
         print(cmd)
         logging.info(cmd)
-        try:
-            check_output(cmd)
-        except CalledProcessError as e:
-            raise Exception(e.output)
+        check_output(cmd)
 
     def apply(self):
         if not self.edited:
             copyfile(self.original, self.original + "_temp")
             self.edited = self.original
             self.original = self.original + "_temp"
-        cmd = [
-            self.xdelta_path,
-            '-f',
-            '-d',
-            '-s',
-            self.original,
-            self.filename,
-            self.edited,
-        ]
+        if self.data is None:
+            cmd = [
+                self.xdelta_path,
+                '-f',
+                '-d',
+                '-s',
+                self.original,
+                self.filename,
+                self.edited,
+            ]
+        else:
+            # Patch from stdin, patched file to stdout
+            cmd = [
+                self.xdelta_path,
+                '-d',
+                '-c',
+                '-s',
+                self.original,
+            ]
 
         logging.info(cmd)
         try:
-            check_output(cmd)
+            if self.data is None:
+                check_output(cmd)
+            else:
+                with open(self.edited, 'wb') as out:
+                    run(cmd, input=self.data, stdout=out, stderr=PIPE, check=True)
         except CalledProcessError:
             raise PatchChecksumError('Target file had incorrect checksum', [])
         finally:
             if self.original.endswith('_temp'):
                 remove(self.original)
+
+
+def benchmark(pairs, work_dir, profiles=None, xdelta_dir='.'):
+    """
+    Encode every (original, edited) pair with each profile, then decode each
+    patch again, and time both. Decoded files are checked against the edited ones.
+    Returns a BenchmarkResult per profile.
+    """
+    results = []
+    for profile in profiles or list(PROFILES):
+        size = encode_time = decode_time = 0
+        try:
+            for i, (original, edited) in enumerate(pairs):
+                patch_path = path.join(work_dir, '%s-%i.xdelta' % (profile, i))
+                decoded = path.join(work_dir, '%s-%i.decoded' % (profile, i))
+
+                start = perf_counter()
+                Patch(original, patch_path, edited=edited, xdelta_dir=xdelta_dir).create(profile)
+                encode_time += perf_counter() - start
+                size += path.getsize(patch_path)
+
+                start = perf_counter()
+                Patch(original, patch_path, edited=decoded, xdelta_dir=xdelta_dir).apply()
+                decode_time += perf_counter() - start
+
+                if file_hash(decoded) != file_hash(edited):
+                    raise PatchChecksumError("%s decoded wrong" % patch_path, [])
+                remove(patch_path)
+                remove(decoded)
+        except PatchChecksumError as e:
+            results.append(BenchmarkResult(profile, None, None, None, str(e)))
+        except (CalledProcessError, OSError):
+            # xdelta3's own message went to stderr already.
+            results.append(BenchmarkResult(profile, None, None, None, "xdelta3 failed on %s" % original))
+        else:
+            results.append(BenchmarkResult(profile, size, encode_time, decode_time, None))
+    return results
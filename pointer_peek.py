@@ -1,102 +1,160 @@
 """
-Takes a file and an offset of a pointer and returns what that pointer points to, location and snippet.
+Takes a file and the offsets of pointers in it, and returns what each pointer points to, location and snippet.
+The file gets mmapped once and every pointer is resolved in one go, so checking
+a whole pointer sheet takes one run instead of one run per pointer.
+
+    python pointer_peek.py GAME.EXE 0x1234 [0x5678 ...] [--original]
+    python pointer_peek.py GAME.EXE - < offsets.txt           (one offset per line)
+    python pointer_peek.py GAME.EXE --sheet=pointers.xlsx     (the Ptr Loc column of GAME.EXE's sheet)
+
+--output=peek.xlsx (or .csv/.tsv/.jsonl) writes the results to a sheet too.
 """
 
 import sys
 import os
-from utils import SRC_PATH, DEST_PATH, unpack, ascii_to_hex_string
-from rominfo import POINTER_CONSTANT
+import mmap
+from collections import namedtuple
+import numpy as np
+from openpyxl import load_workbook
+try:
+    from . import rominfo
+    from .writers import open_dump_writer
+except ImportError:
+    import rominfo
+    from writers import open_dump_writer
+
+POINTER_CONSTANT = rominfo.POINTER_CONSTANT
+
+SRC_PATH = getattr(rominfo, 'SRC_ROM_DIR', '')
+DEST_PATH = getattr(rominfo, 'DEST_ROM_DIR', '')
+
+# Lots of things listed in the pointer spreadsheet are 2 too high, and point to the "ptr begin" ctrl code.
+PTR_BEGIN = 0xb81e
+
+# offset: where the pointer was read from (after the PTR_BEGIN fix),
+# requested: the offset that was asked for.
+Peek = namedtuple('Peek', ['requested', 'offset', 'value', 'target', 'text', 'bytestring'])
+
+PEEK_COLUMNS = ['Ptr Loc', 'Read From', 'Value', 'Points To', 'Text', 'Bytes']
+
+
+def words_at_offsets(data, offsets):
+    """Little-endian words at each offset of a uint8 array, as an int array."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    return data[offsets].astype(np.int64) | (data[offsets + 1].astype(np.int64) << 8)
+
+
+def peek_pointers(filepath, offsets, constant, go_until_wait=False):
+    """
+    Resolve every pointer at "offsets" in a file: its value, what it points to,
+    and the text there (up to the END code, or the WAIT code with go_until_wait).
+    Offsets that read as PTR_BEGIN get read again 2 bytes later.
+    Offsets past the end of the file are skipped.
+    """
+    terminator = b'\x13' if go_until_wait else b'\x00'
+    with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = np.frombuffer(mm, dtype=np.uint8)
+        requested = np.asarray(offsets, dtype=np.int64)
+        requested = requested[(requested >= 0) & (requested + 1 < len(data))]
+
+        values = words_at_offsets(data, requested)
+        read_from = requested.copy()
+        begins = (values == PTR_BEGIN) & (requested + 3 < len(data))
+        read_from[begins] += 2
+        values[begins] = words_at_offsets(data, read_from[begins])
+        targets = values + constant
+
+        peeks = []
+        for req, off, value, target in zip(requested.tolist(), read_from.tolist(),
+                                           values.tolist(), targets.tolist()):
+            text = bytestring = None
+            if 0 <= target < len(mm):
+                end = mm.find(terminator, target)
+                bytestring = mm[target:end if end != -1 else len(mm)]
+                try:
+                    text = bytestring.decode('shift_jis')
+                except UnicodeDecodeError:
+                    text = ' '.join('{0:02x}'.format(b) for b in bytestring)
+            peeks.append(Peek(req, off, value, target, text, bytestring))
+        # numpy's view of the mmap has to go before the mmap can close.
+        del data
+    return peeks
 
-def ensure_src_file_path(str):
-    try:
-        f = open(str, 'r')
-        f.close()
-    except IOError:
-        str = os.path.join(SRC_PATH, str)
-        f = open(str, 'r')
-        f.close()
-    return str
-
-def ensure_dest_file_path(str):
-    try:
-        f = open(str, 'r')
-        f.close()
-    except IOError:
-        str = os.path.join(DEST_PATH, str)
-        f = open(str, 'r')
-        f.close()
-    return str
 
 def word_at_offset(filename, offset):
-    #filename = ensure_src_file_path(filename)
     with open(filename, 'rb') as f:
-        result = ""
         f.seek(offset)
-        data = f.read(2)
-        for b in data:
-            result += "%02x" % ord(b)
-        return unpack(result[0:2], result[2:])
+        return int.from_bytes(f.read(2), byteorder='little')
+
 
 def text_at_offset(filename, offset, go_until_wait=False):
-    try:
-        f = open(filename, 'rb')
-    except TypeError:
-        filename = os.path.join(DEST_PATH, filename.filename)
-        f = open(filename, 'rb')
-
-    f.seek(offset)
-    result = ""
-    data = f.read(1)
-    if go_until_wait:
-        control_code = 0x13
-    else:
-        control_code = 00
+    terminator = b'\x13' if go_until_wait else b'\x00'
+    with open(filename, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = mm.find(terminator, offset)
+        return mm[offset:end if end != -1 else len(mm)]
 
-    while ord(data) != control_code:   # END control code
-        result += data
-        data = f.read(1)
-    f.close()
-    return result
 
-def text_with_pointer(gamefile, pointer_offset):
-    pointer_offset = int(pointer_offset, 16)
-    constant = POINTER_CONSTANT[filename]
-    try: 
-        f = open(gamefile.filename, 'rb')
-        f.close()
-    except IOError:
-        gamefile.filename = os.path.join(DEST_PATH, gamefile.filename)
+def sheet_offsets(sheet_path, sheet_name):
+    """The Ptr Loc column of a pointer sheet (see dump.PointerExcel)."""
+    workbook = load_workbook(sheet_path, read_only=True, data_only=True)
+    offsets = []
+    try:
+        for row in workbook[sheet_name].iter_rows(min_row=2, values_only=True):
+            try:
+                offsets.append(int(row[1], 16))
+            except (IndexError, TypeError, ValueError):
+                continue
+    finally:
+        workbook.close()
+    return offsets
 
-        destination = word_at_offset(gamefile.filename, pointer_offset) + constant
 
-        return text_at_offset(gamefile, destination)
+def parse_offsets(lines):
+    offsets = []
+    for line in lines:
+        for token in line.replace(',', ' ').split():
+            offsets.append(int(token, 16))
+    return offsets
 
-def bytestring_at_offset(filename, offset):
-    return ascii_to_hex_string(text_at_offset(filename, offset))
 
 if __name__ == '__main__':
-    filename = sys.argv[1]
+    args = sys.argv[1:]
+    if len(args) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    filename = args.pop(0)
+    original = '--original' in args
+    sheet_path = output_path = None
+    offset_args = []
+    for a in args:
+        if a.startswith('--sheet='):
+            sheet_path = a.split('=', 1)[1]
+        elif a.startswith('--output='):
+            output_path = a.split('=', 1)[1]
+        elif a != '--original':
+            offset_args.append(a)
+
     constant = POINTER_CONSTANT[filename]
+    filepath = os.path.join(SRC_PATH if original else DEST_PATH, filename)
 
-    offset = int(sys.argv[2], 16)
-    if len(sys.argv) > 3:
-        original = sys.argv[3] == '--original'
+    if sheet_path:
+        offsets = sheet_offsets(sheet_path, filename)
+    elif offset_args == ['-']:
+        offsets = parse_offsets(sys.stdin)
     else:
-        original = False
+        offsets = parse_offsets(offset_args)
 
-    if original:
-        filepath = os.path.join(SRC_PATH, filename)
-    else:
-        filepath = os.path.join(DEST_PATH, filename)
-        
-    pointer_value =  word_at_offset(filepath, offset)
-
-    print "value:", hex(pointer_value)
-    if pointer_value == 0xb81e:
-        # Lots of things listed in the pointer spreadhseet are 2 too high, and point to the "ptr begin" ctrl code.
-        print "I think you meant %s" % offset
-        pointer_value = word_at_offset(filepath, offset+2)
-    pointed_location = pointer_value + constant
-    print "points to:", hex(pointed_location)
-    print text_at_offset(filepath, pointed_location)
-    print bytestring_at_offset(filepath, pointed_location)
+    peeks = peek_pointers(filepath, offsets, constant)
+    for p in peeks:
+        if p.offset != p.requested:
+            print("%s: I think you meant %s" % (hex(p.requested), hex(p.offset)))
+        print("%s value: %s points to: %s" % (hex(p.offset), hex(p.value), hex(p.target)))
+        print("    ", p.text)
+        print("    ", p.bytestring)
+
+    if output_path:
+        with open_dump_writer(output_path, PEEK_COLUMNS, sheet_name=filename) as writer:
+            for p in peeks:
+                bytestring = ' '.join('{0:02x}'.format(b) for b in p.bytestring) if p.bytestring is not None else None
+                writer.write_row([hex(p.requested), hex(p.offset), hex(p.value), hex(p.target), p.text, bytestring])
@@ -0,0 +1,167 @@
+"""
+Finds the strings of an existing dump in a different version of the same
+gamefile (FD -> CD, v1.0 -> v1.1...), to fill in a new offset column.
+
+Every string gets looked up in a k-mer index of the new file (sorted 4-byte
+codes at every position). Strings found exactly once are anchors. A string
+found more than once gets the candidate closest to where its neighbors moved,
+between the anchors around it, so repeated strings like "はい" end up in the
+right block.
+
+    python rebase.py dump.xlsx GAME.EXE new/GAME.EXE [rebased.xlsx] [--sheet=Everything] [--kind=offset]
+"""
+
+import sys
+from collections import namedtuple
+import numpy as np
+try:
+    from .dump import ControlCodeTable
+    from .writers import open_dump_writer
+except ImportError:
+    from dump import ControlCodeTable
+    from writers import open_dump_writer
+
+K = 4
+
+# status: 'unique' (one match), 'anchored' (picked by its neighbors),
+# 'missing' (not in the new file), or 'ambiguous' (several matches, no offset to go by).
+Rebased = namedtuple('Rebased', ['row', 'old_offset', 'new_offset', 'status', 'candidates'])
+
+REBASE_COLUMNS = ['File', 'Old Offset', 'New Offset', 'Japanese', 'Status', 'Candidates']
+REBASE_WIDTHS = [15, 10, 10, 60, 10, 30]
+
+
+class KmerIndex(object):
+    """Every position of a file, sorted by the K bytes starting there."""
+    def __init__(self, filestring, k=K):
+        self.filestring = bytes(filestring)
+        self.k = k
+        data = np.frombuffer(self.filestring, dtype=np.uint8).astype(np.uint64)
+        n = len(data) - k + 1
+        if n > 0:
+            codes = np.zeros(n, dtype=np.uint64)
+            for i in range(k):
+                codes = (codes << np.uint64(8)) | data[i:i + n]
+            self.positions = np.argsort(codes, kind='stable')
+            self.codes = codes[self.positions]
+        else:
+            self.positions = np.zeros(0, dtype=np.int64)
+            self.codes = np.zeros(0, dtype=np.uint64)
+
+    def _code(self, s):
+        return np.uint64(int.from_bytes(s[:self.k], 'big'))
+
+    def _range(self, kmer):
+        code = self._code(kmer)
+        return np.searchsorted(self.codes, code, 'left'), np.searchsorted(self.codes, code, 'right')
+
+    def find_all(self, needle):
+        """Sorted offsets of every occurrence of needle."""
+        if not needle:
+            return []
+        if len(needle) < self.k:
+            found, i = [], self.filestring.find(needle)
+            while i != -1:
+                found.append(i)
+                i = self.filestring.find(needle, i + 1)
+            return found
+
+        # Look up the needle's rarest k-mer, then check the whole string at each hit.
+        best = None
+        for j in range(0, len(needle) - self.k + 1):
+            lo, hi = self._range(needle[j:j + self.k])
+            if best is None or hi - lo < best[2] - best[1]:
+                best = (j, lo, hi)
+            if hi - lo <= 1:
+                break
+        j, lo, hi = best
+        starts = np.sort(self.positions[lo:hi]) - j
+        return [s for s in starts.tolist()
+                if s >= 0 and self.filestring[s:s + len(needle)] == needle]
+
+
+def rebase(rows, new_filestring, kind='offset', control_codes={}, index=None):
+    """
+    A Rebased for each DumpRow, in the same order, with its offset in new_filestring.
+    kind is the old offset column to anchor by (offset/cd_offset/compressed_offset).
+    """
+    index = index or KmerIndex(new_filestring)
+    table = ControlCodeTable.of(control_codes)
+
+    rows = list(rows)
+    olds = [getattr(r, kind) for r in rows]
+    candidates = [index.find_all(table.encode(r.japanese)) for r in rows]
+
+    # Work through the rows in old offset order; rows with no old offset come last.
+    order = sorted(range(len(rows)), key=lambda i: (olds[i] is None, olds[i] or 0))
+
+    # Unique matches with an old offset are the anchors. For each row, the
+    # next anchor's new offset is an upper bound for its match.
+    next_anchor = [None] * len(order)
+    upcoming = None
+    for n in reversed(range(len(order))):
+        next_anchor[n] = upcoming
+        i = order[n]
+        if olds[i] is not None and len(candidates[i]) == 1:
+            upcoming = candidates[i][0]
+
+    results = [None] * len(rows)
+    last_old = last_new = None
+    for n, i in enumerate(order):
+        found, old = candidates[i], olds[i]
+        if not found:
+            new, status = None, 'missing'
+        elif len(found) == 1:
+            new, status = found[0], 'unique'
+        elif old is None:
+            new, status = None, 'ambiguous'
+        else:
+            # Keep the strings in order: after the last match, before the next anchor.
+            in_order = [c for c in found
+                        if (last_new is None or c > last_new) and
+                           (next_anchor[n] is None or c < next_anchor[n])] or found
+            expected = old + (last_new - last_old if last_new is not None else 0)
+            new = min(in_order, key=lambda c: abs(c - expected))
+            status = 'anchored'
+
+        if new is not None and old is not None:
+            last_old, last_new = old, new
+        results[i] = Rebased(rows[i], old, new, status, found)
+    return results
+
+
+def write_rebased(path, results):
+    with open_dump_writer(path, REBASE_COLUMNS, REBASE_WIDTHS, sheet_name='Rebased') as writer:
+        for r in results:
+            writer.write_row([r.row.filename,
+                              '0x%05x' % r.old_offset if r.old_offset is not None else None,
+                              '0x%05x' % r.new_offset if r.new_offset is not None else None,
+                              r.row.japanese.decode('shift-jis'),
+                              r.status,
+                              '; '.join(hex(c) for c in r.candidates) if len(r.candidates) > 1 else None])
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    options = dict(a[2:].split('=', 1) for a in sys.argv[1:] if a.startswith('--') and '=' in a)
+    if len(args) < 3:
+        print(__doc__)
+        sys.exit(1)
+
+    from dump import DumpExcel
+
+    dump_path, filename, new_path = args[:3]
+    output_path = args[3] if len(args) > 3 else filename + '_rebased.xlsx'
+    store = DumpExcel(dump_path)
+    sheet_name = options.get('sheet')
+    if sheet_name and store.has_filenames(sheet_name):
+        rows = store.rows(sheet_name, filename)
+    else:
+        rows = store.rows(sheet_name or filename)
+
+    with open(new_path, 'rb') as f:
+        results = rebase(rows, f.read(), kind=options.get('kind', 'offset'))
+    write_rebased(output_path, results)
+
+    for status in ('unique', 'anchored', 'ambiguous', 'missing'):
+        print("%s: %i" % (status, sum(1 for r in results if r.status == status)))
@@ -0,0 +1,101 @@
+"""
+Parallel reinsertion driver.
+The per-gamefile work (get_translations, block edits, pointer edits,
+Gamefile.write(skip_disk=True)) doesn't depend on any other gamefile, so it
+runs in a process pool. NDC can only have one writer per disk image, so
+finished files go into one insert queue per destination disk.
+
+The build function does the game-specific part. It gets one ReinsertJob,
+and returns the path of the file it wrote, or a (path, cache_entry) tuple
+from BuildCache.entry() so the driver can update the build cache:
+
+    def build(job):
+        cache = BuildCache(CACHE_PATH)
+        gamefile = Gamefile(job.source, disk=...)
+        translations = DumpExcel(DUMP_XLS_PATH).get_translations(gamefile)
+        if cache.is_fresh(gamefile, translations):
+            return cache.output_path(gamefile)
+        ...block and pointer edits...
+        written = gamefile.write(skip_disk=True)
+        return written, cache.entry(gamefile, translations, written)
+
+    if __name__ == '__main__':
+        reinsert(jobs, build, cache=BuildCache(CACHE_PATH))
+
+build has to be a module-level function so it can be pickled, and the
+reinserter needs the __main__ guard so worker processes don't re-run it.
+Jobs only carry the destination disk's path; the Disks (and NDC) stay in
+the main process.
+"""
+
+from collections import namedtuple
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+try:
+    from .disk import Disk
+except ImportError:
+    from disk import Disk
+
+# source: path of the original gamefile. dest_disk_path: path of the disk image
+# it gets inserted into. path_in_disk: where in that disk. data: anything else build() needs.
+ReinsertJob = namedtuple('ReinsertJob', ['source', 'dest_disk_path', 'path_in_disk', 'data'])
+ReinsertJob.__new__.__defaults__ = ('', None)
+
+
+def reinsert(jobs, build, max_workers=None, cache=None, in_order=True, open_disk=Disk):
+    """
+    Build every job in a process pool and insert the results.
+    With in_order, each disk gets its files in the order of "jobs" (for
+    nearly-full floppies where the insertion order matters); otherwise
+    files are inserted as soon as they're built.
+    open_disk makes the Disk for a dest_disk_path, once per path
+    (e.g. lambda p: Disk(p, ndc_dir='bin')).
+    Returns the written paths, in the order of "jobs".
+    """
+    jobs = list(jobs)
+    disks = {}
+    insert_queues = {}
+    inserts = []
+    written = [None] * len(jobs)
+
+    def enqueue(i, result):
+        job = jobs[i]
+        if isinstance(result, tuple):
+            result, cache_entry = result
+            if cache is not None and cache_entry is not None:
+                cache.update(*cache_entry)
+        written[i] = result
+        if result is None:
+            return
+        disk_path = job.dest_disk_path
+        if disk_path not in disks:
+            disks[disk_path] = open_disk(disk_path)
+            insert_queues[disk_path] = ThreadPoolExecutor(max_workers=1)
+        print("queued for %s: %s" % (disk_path, result))
+        inserts.append(insert_queues[disk_path].submit(
+            disks[disk_path].insert, result, path_in_disk=job.path_in_disk))
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(build, job) for job in jobs]
+            if in_order:
+                for i, future in enumerate(futures):
+                    enqueue(i, future.result())
+            else:
+                index = {future: i for i, future in enumerate(futures)}
+                for future in as_completed(futures):
+                    enqueue(index[future], future.result())
+    finally:
+        for queue in insert_queues.values():
+            queue.shutdown(wait=True)
+
+    # Surface any insert errors.
+    for insert in inserts:
+        insert.result()
+
+    if cache is not None:
+        cache.save()
+    return written
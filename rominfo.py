@@ -1,6 +1,8 @@
 """ Basic configuration things you'd want to store about a rom.
 """
 
+import os
+
 """
 	Directory layout and paths.
 """
@@ -9,7 +11,7 @@ SRC_ROM_DIR = ''
 SRC_ROM_PATH = os.path.join(SRC_ROM_DIR, SRC_ROM_FILENAME)
 
 DEST_ROM_FILENAME = ''
-SRC_ROM_DIR = ''
+DEST_ROM_DIR = ''
 DEST_ROM_PATH = os.path.join(DEST_ROM_DIR, DEST_ROM_FILENAME)
 
 """
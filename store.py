@@ -0,0 +1,181 @@
+"""
+Translation stores besides the dump xlsx. They have the same
+get_translations(target, sheet_name, include_blank, use_cd_location) as
+DumpExcel, so a reinserter can switch by changing one line.
+
+* SQLiteStore: rows are indexed by sheet, file and each offset column, so a
+  block query only reads that block's rows.
+* DelimitedStore: a folder of CSV/TSV files (one per sheet) with the same
+  headers as the dump xlsx. Good for diffing scripts in git.
+
+To convert an existing dump:
+    python store.py dump.xlsx dump.sqlite
+"""
+
+import csv
+import sqlite3
+import sys
+from os import listdir
+from os.path import isdir, join, splitext, basename
+try:
+    from .dump import (
+        DumpExcel,
+        DumpRow,
+        OFFSET_KINDS,
+        SheetIndex,
+        TranslationStore,
+        parse_dump_rows,
+    )
+except ImportError:
+    from dump import (
+        DumpExcel,
+        DumpRow,
+        OFFSET_KINDS,
+        SheetIndex,
+        TranslationStore,
+        parse_dump_rows,
+    )
+
+DELIMITED_EXTENSIONS = {'.csv': ',', '.tsv': '\t', '.txt': '\t'}
+
+# "offset" is an SQL keyword, so the columns are always quoted.
+SQLITE_COLUMNS = ['sheet', 'row'] + list(DumpRow._fields)
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS sheets (
+    "name" TEXT PRIMARY KEY,
+    "has_filenames" INTEGER
+);
+CREATE TABLE IF NOT EXISTS translations (
+    "sheet" TEXT, "row" INTEGER, "filename" TEXT,
+    "offset" INTEGER, "cd_offset" INTEGER, "compressed_offset" INTEGER, "total_offset" INTEGER,
+    "japanese" BLOB, "english" BLOB, "category", "portrait", "prefix" BLOB,
+    "suffix", "command", "pointers" TEXT
+);
+CREATE INDEX IF NOT EXISTS translations_row ON translations ("sheet", "filename", "row");
+CREATE INDEX IF NOT EXISTS translations_offset ON translations ("sheet", "filename", "offset");
+CREATE INDEX IF NOT EXISTS translations_cd_offset ON translations ("sheet", "filename", "cd_offset");
+CREATE INDEX IF NOT EXISTS translations_compressed_offset ON translations ("sheet", "filename", "compressed_offset");
+'''
+
+
+class DelimitedStore(TranslationStore):
+    """
+    A folder of .csv/.tsv files, one per sheet and named after it
+    (GAME.EXE.csv is the sheet GAME.EXE), or a single one of those files.
+    Each sheet is parsed once, the first time it's asked for.
+    Cells are all text, so Category/Portrait come back as strings.
+    """
+    def __init__(self, path, control_codes={}):
+        super(DelimitedStore, self).__init__(control_codes)
+        self.path = path
+        if isdir(path):
+            filenames = [join(path, f) for f in sorted(listdir(path))]
+        else:
+            filenames = [path]
+
+        self._files = {}
+        for f in filenames:
+            sheet_name, extension = splitext(basename(f))
+            if extension.lower() in DELIMITED_EXTENSIONS:
+                self._files[sheet_name] = f
+        self.sheetnames = list(self._files)
+        self._indexes = {}
+
+    def sheet_index(self, sheet_name):
+        if sheet_name not in self._indexes:
+            filepath = self._files[sheet_name]
+            delimiter = DELIMITED_EXTENSIONS[splitext(filepath)[1].lower()]
+            with open(filepath, 'r', encoding='utf-8-sig', newline='') as f:
+                # Empty cells are None, like in openpyxl.
+                rows = ([cell if cell != '' else None for cell in row]
+                        for row in csv.reader(f, delimiter=delimiter))
+                self._indexes[sheet_name] = SheetIndex(parse_dump_rows(rows))
+        return self._indexes[sheet_name]
+
+
+class SQLiteStore(TranslationStore):
+    """
+    Translations in a SQLite db, queried by file and offset range without
+    loading the rest of the script. Make one with import_excel().
+    """
+    def __init__(self, db_path, control_codes={}):
+        super(SQLiteStore, self).__init__(control_codes)
+        self.path = db_path
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript(SQLITE_SCHEMA)
+        self._has_filenames = dict(self.db.execute('SELECT "name", "has_filenames" FROM sheets'))
+        self.sheetnames = list(self._has_filenames)
+
+    def has_filenames(self, sheet_name):
+        return bool(self._has_filenames[sheet_name])
+
+    def rows(self, sheet_name, filename=None, start=None, stop=None, kind='offset'):
+        if kind not in OFFSET_KINDS:
+            raise ValueError('Unknown offset column: %s' % kind)
+
+        query = 'SELECT %s FROM translations WHERE "sheet" = ?' % ', '.join('"%s"' % c for c in DumpRow._fields)
+        params = [sheet_name]
+        if filename is not None:
+            query += ' AND "filename" = ?'
+            params.append(filename)
+        if start is None:
+            query += ' ORDER BY "row"'
+        else:
+            query += ' AND "%s" >= ? AND "%s" < ? ORDER BY "%s", "row"' % (kind, kind, kind)
+            params += [start, stop]
+
+        return [self._row(r) for r in self.db.execute(query, params)]
+
+    def _row(self, r):
+        r = DumpRow(*r)
+        if r.pointers is not None:
+            r = r._replace(pointers=[int(loc, 16) for loc in r.pointers.split("; ")])
+        return r
+
+    def write_sheet(self, sheet_name, rows):
+        """Replace a sheet's rows with these DumpRows."""
+        rows = list(rows)
+        has_filenames = any(r.filename is not None for r in rows)
+        with self.db:
+            self.db.execute('DELETE FROM translations WHERE "sheet" = ?', (sheet_name,))
+            self.db.execute('INSERT OR REPLACE INTO sheets VALUES (?, ?)', (sheet_name, int(has_filenames)))
+            self.db.executemany(
+                'INSERT INTO translations (%s) VALUES (%s)' % (
+                    ', '.join('"%s"' % c for c in SQLITE_COLUMNS),
+                    ', '.join('?' * len(SQLITE_COLUMNS))),
+                ((sheet_name, i) + tuple(self._db_values(r)) for i, r in enumerate(rows)))
+        self._has_filenames[sheet_name] = has_filenames
+        if sheet_name not in self.sheetnames:
+            self.sheetnames.append(sheet_name)
+
+    def _db_values(self, r):
+        if r.pointers is not None:
+            r = r._replace(pointers="; ".join(hex(p) for p in r.pointers))
+        return r
+
+    def close(self):
+        self.db.close()
+
+
+def import_excel(excel_path, db_path):
+    """Copy every dump sheet of an xlsx into a SQLite db. Returns the SQLiteStore."""
+    dump = DumpExcel(excel_path, use_sidecar=False)
+    store = SQLiteStore(db_path)
+    for sheet_name in dump.sheetnames:
+        try:
+            rows = dump.sheet_index(sheet_name).rows
+        except ValueError:
+            # Not a dump sheet
+            continue
+        print("Importing %s (%i rows)" % (sheet_name, len(rows)))
+        store.write_sheet(sheet_name, rows)
+    dump.close()
+    return store
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print("Usage: python store.py dump.xlsx dump.sqlite")
+        sys.exit(1)
+    import_excel(sys.argv[1], sys.argv[2]).close()
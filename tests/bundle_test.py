@@ -0,0 +1,50 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from romtools.bundle import BundleError, PatchBundle, bundle_dir
+
+
+class TestPatchBundle(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.patch_dir = os.path.join(self.dir, 'patch')
+        os.mkdir(self.patch_dir)
+        self.patches = {'GAME.EXE.xdelta': b'\xd6\xc3\xc4\x00game', 'DATA.DAT.xdelta': b'\xd6\xc3\xc4\x00data!'}
+        for name, data in self.patches.items():
+            with open(os.path.join(self.patch_dir, name), 'wb') as f:
+                f.write(data)
+        self.bundle_path = os.path.join(self.dir, 'patch.bundle')
+        bundle_dir(self.patch_dir, self.bundle_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_read(self):
+        with PatchBundle(self.bundle_path) as bundle:
+            self.assertEqual(sorted(bundle.names()), sorted(self.patches))
+            self.assertTrue(bundle.verify())
+            for name, data in self.patches.items():
+                self.assertEqual(bytes(bundle.get(name)), data)
+                self.assertTrue(bundle.verify_patch(name))
+            self.assertNotIn('OTHER.xdelta', bundle)
+
+    def test_close_with_patch_held(self):
+        bundle = PatchBundle(self.bundle_path)
+        data = bundle.get('GAME.EXE.xdelta')
+        bundle.close()
+        with self.assertRaises(ValueError):
+            bytes(data)
+
+    def test_corrupted(self):
+        with open(self.bundle_path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            f.write(b'?')
+        with PatchBundle(self.bundle_path) as bundle:
+            self.assertFalse(bundle.verify())
+
+        with open(self.bundle_path, 'wb') as f:
+            f.write(b'not a bundle at all')
+        with self.assertRaises(BundleError):
+            PatchBundle(self.bundle_path)
@@ -0,0 +1,61 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from romtools.cache import BuildCache
+from romtools.disk import Gamefile
+from romtools.dump import Translation
+
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, 'GAME.EXE')
+        with open(self.src, 'wb') as f:
+            f.write(b'\x00\x82\xa0\x82\xa2\x00')
+        self.out = os.path.join(self.dir, 'GAME.EXE.out')
+        with open(self.out, 'wb') as f:
+            f.write(b'\x00Hi\x00')
+        self.cache_path = os.path.join(self.dir, 'build_cache.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def translations(self, english):
+        return [Translation(None, 1, b'\x82\xa0\x82\xa2', english)]
+
+    def test_fresh_after_record(self):
+        gf = Gamefile(self.src)
+        cache = BuildCache(self.cache_path)
+        self.assertFalse(cache.is_fresh(gf, self.translations(b'Hi')))
+        cache.record(gf, self.translations(b'Hi'), self.out)
+        cache.save()
+
+        cache = BuildCache(self.cache_path)
+        self.assertTrue(cache.is_fresh(gf, self.translations(b'Hi')))
+        self.assertFalse(cache.is_fresh(gf, self.translations(b'Hello')))
+        self.assertEqual(len(cache.changed_rows(gf, self.translations(b'Hello'))), 1)
+
+    def test_stale_when_output_changes(self):
+        gf = Gamefile(self.src)
+        cache = BuildCache(self.cache_path)
+        cache.record(gf, self.translations(b'Hi'), self.out)
+        with open(self.out, 'wb') as f:
+            f.write(b'tampered')
+        self.assertFalse(cache.is_fresh(gf, self.translations(b'Hi')))
+
+    def test_reuse(self):
+        inserted = []
+
+        class FakeDisk(object):
+            def insert(self, filepath, path_in_disk=None):
+                inserted.append((filepath, path_in_disk))
+
+        gf = Gamefile(self.src, dest_disk=FakeDisk())
+        cache = BuildCache(self.cache_path)
+        self.assertIsNone(cache.reuse(gf, path_in_disk='GAME'))
+        cache.record(gf, self.translations(b'Hi'), self.out)
+        self.assertEqual(cache.reuse(gf, path_in_disk='GAME'), self.out)
+        self.assertEqual(gf.filestring, b'\x00Hi\x00')
+        self.assertEqual(inserted, [(self.out, 'GAME')])
@@ -0,0 +1,39 @@
+import unittest
+
+from romtools.checker import WidthChecker
+from romtools.disk import Block, Gamefile
+from romtools.dump import Translation
+
+
+class TestWidthChecker(unittest.TestCase):
+    CODES = {b'[LN]': b'\x0a', b'[W]': b'\x13'}
+
+    def test_line_width(self):
+        checker = WidthChecker(8, 2, '\n', self.CODES)
+        self.assertEqual(checker.check(b'Hello[W][LN]there'), [])
+        self.assertEqual(checker.check(b'Hello there'), [(1, 'width', 11, 8)])
+        # Fullwidth characters are 2 wide
+        self.assertEqual(checker.check('ああああ'.encode('shift-jis') + b'!'), [(1, 'width', 9, 8)])
+
+    def test_window_lines(self):
+        checker = WidthChecker(8, 2, '\n', self.CODES)
+        self.assertEqual(checker.check(b'a[LN]b\nc'), [(None, 'lines', 3, 2)])
+
+    def test_glyph_widths(self):
+        checker = WidthChecker(4, glyph_widths={'i': 0.5, 'l': 0.5})
+        self.assertEqual(checker.check(b'illiii'), [])
+        self.assertEqual(checker.check(b'Wide'), [])
+        self.assertEqual(checker.check(b'Wordy'), [(1, 'width', 5, 4)])
+
+    def test_translations(self):
+        checker = WidthChecker(4)
+        overflows = checker.check_translations([Translation('A.EXE', 0x10, b'', b'Too long')])
+        self.assertEqual([(o.filename, o.location, o.size) for o in overflows], [('A.EXE', 0x10, 8)])
+
+    def test_block_translations(self):
+        gamefile = Gamefile.__new__(Gamefile)
+        gamefile.filename = 'A.EXE'
+        block = Block.__new__(Block)
+        block.gamefile = gamefile
+        overflows = WidthChecker(4).check_translations([Translation(block, 0x10, b'', b'Too long')])
+        self.assertEqual([o.filename for o in overflows], ['A.EXE'])
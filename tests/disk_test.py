@@ -0,0 +1,55 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from romtools.disk import Gamefile
+from romtools.dump import BorlandPointer, Translation
+
+
+class TestVerifyPointers(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'GAME.EXE')
+        # Pointer table at 0x0, strings at 0x10 and 0x14 (values 0xff10 and 0xff14, constant -0xff00)
+        with open(self.path, 'wb') as f:
+            f.write(b'\x10\xff\x14\xff' + b'\x00' * 12 + b'Hi\x00\x00Yo\x00')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def gamefile(self):
+        gf = Gamefile(self.path, pointer_constant=-0xff00)
+        gf.pointers = {0x10: [BorlandPointer(gf, 0, 0x10)], 0x14: [BorlandPointer(gf, 2, 0x14)]}
+        return gf
+
+    def test_good_pointers(self):
+        gf = self.gamefile()
+        translations = [Translation(gf, 0x10, b'', b'Hi'), Translation(gf, 0x14, b'', b'Yo')]
+        self.assertEqual(gf.verify_pointers(translations), [])
+
+    def test_broken_pointers(self):
+        gf = self.gamefile()
+        # Second pointer now points into the middle of "Yo"
+        gf.edit(2, b'\x15\xff')
+        translations = [Translation(gf, 0x10, b'', b'Hey')]
+        problems = [(m.pointer.location, m.problem) for m in gf.verify_pointers(translations)]
+        self.assertEqual(problems, [(0, 'text mismatch'), (2, 'not a string start')])
+
+    def test_prefix_is_a_mismatch(self):
+        gf = self.gamefile()
+        # The pointer goes to "Hi", but the translation is only "H"
+        translations = [Translation(gf, 0x10, b'', b'H'), Translation(gf, 0x14, b'', b'Yo')]
+        problems = [(m.pointer.location, m.problem, m.found) for m in gf.verify_pointers(translations)]
+        self.assertEqual(problems, [(0, 'text mismatch', b'Hi')])
+
+    def test_multibyte_separator(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'\x10\xff\x14\xff\x13\xff' + b'\r\n' * 5 + b'Hi\r\nYo\r\n')
+        gf = Gamefile(self.path, pointer_constant=-0xff00)
+        gf.pointers = {0x10: [BorlandPointer(gf, 0, 0x10)], 0x14: [BorlandPointer(gf, 2, 0x14)],
+                       0x13: [BorlandPointer(gf, 4, 0x13)]}
+        translations = [Translation(gf, 0x10, b'', b'Hi'), Translation(gf, 0x14, b'', b'Yo')]
+        problems = [(m.pointer.location, m.problem) for m in gf.verify_pointers(translations, separator=b'\r\n')]
+        # 0x13 is the '\n' of a separator, after just the '\r'
+        self.assertEqual(problems, [(4, 'not a string start')])
@@ -0,0 +1,204 @@
+import unittest
+import os
+import time
+import tempfile
+import shutil
+from openpyxl import Workbook
+
+from unittest import mock
+
+from romtools import dump
+from romtools.dump import (
+    BorlandPointer,
+    ControlCodeTable,
+    DumpExcel,
+    PointerExcel,
+    Translation,
+    pointer_texts,
+    sjis_to_hex_string,
+)
+
+
+class FakeGamefile(object):
+    pointer_constant = 0x100
+
+    def __init__(self, filename):
+        self.filename = filename
+
+
+class FakeBlock(object):
+    def __init__(self, gamefile, start, stop):
+        self.gamefile = gamefile
+        self.start = start
+        self.stop = stop
+
+
+class TestDumpExcel(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'dump.xlsx')
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'GAME.EXE'
+        ws.append(['Offset', 'Japanese', 'English'])
+        ws.append(['0x30', 'う', 'u'])
+        ws.append(['0x10', 'あ', 'a'])
+        ws.append(['0x20', 'い', None])
+        ws.append([None, None, None])
+        ws.append(['0x40', 'え', 'e'])
+
+        multi = wb.create_sheet('Everything')
+        multi.append(['Offset', 'Japanese', 'English', 'File'])
+        multi.append(['0x10', 'か', 'ka', 'A.EXE'])
+        multi.append(['0x10', 'さ', 'sa', 'B.EXE'])
+        multi.append([None, None, None, None])
+        multi.append(['0x20', 'き', 'ki', 'A.EXE'])
+        wb.save(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_file_translations_in_sheet_order(self):
+        dump = DumpExcel(self.path)
+        trans = dump.get_translations('GAME.EXE')
+        self.assertEqual([t.location for t in trans], [0x30, 0x10])
+        trans = dump.get_translations('GAME.EXE', include_blank=True)
+        self.assertEqual([t.location for t in trans], [0x30, 0x10, 0x20])
+
+    def test_block_translations(self):
+        dump = DumpExcel(self.path)
+        block = FakeBlock(FakeGamefile('GAME.EXE'), 0x10, 0x30)
+        trans = dump.get_translations(block, include_blank=True)
+        self.assertEqual([t.location for t in trans], [0x10, 0x20])
+        self.assertEqual(trans[0].english, b'a')
+
+    def test_multi_file_sheet(self):
+        dump = DumpExcel(self.path)
+        trans = dump.get_translations('A.EXE', sheet_name='Everything')
+        self.assertEqual([t.english for t in trans], [b'ka', b'ki'])
+        block = FakeBlock(FakeGamefile('B.EXE'), 0, 0x100)
+        trans = dump.get_translations(block, sheet_name='Everything')
+        self.assertEqual([t.english for t in trans], [b'sa'])
+
+    def test_sidecar_skips_openpyxl(self):
+        DumpExcel(self.path)
+        self.assertTrue(os.path.isfile(self.path + dump.SIDECAR_EXTENSION))
+        with mock.patch.object(dump, 'load_workbook', side_effect=AssertionError):
+            trans = DumpExcel(self.path).get_translations('GAME.EXE')
+        self.assertEqual([t.location for t in trans], [0x30, 0x10])
+
+    def test_broken_sheet_only_fails_when_queried(self):
+        wb = Workbook()
+        wb.active.title = 'GAME.EXE'
+        wb.active.append(['Offset', 'Japanese', 'English'])
+        wb.active.append(['0x10', 'あ', 'a'])
+        broken = wb.create_sheet('BROKEN.EXE')
+        broken.append(['Offset', 'Japanese', 'English', 'Ctrl Codes'])
+        broken.append(['0x10', 'あ', 'a', 5])
+        wb.save(self.path)
+        for use_sidecar in (False, True):
+            dump_excel = DumpExcel(self.path, use_sidecar=use_sidecar)
+            self.assertEqual(len(dump_excel.get_translations('GAME.EXE')), 1)
+            with self.assertRaises(AttributeError):
+                dump_excel.get_translations('BROKEN.EXE')
+
+    def test_sidecar_invalidated_by_edit(self):
+        DumpExcel(self.path)
+        wb = Workbook()
+        wb.active.title = 'GAME.EXE'
+        wb.active.append(['Offset', 'Japanese', 'English'])
+        wb.active.append(['0x50', 'お', 'o'])
+        time.sleep(0.01)
+        wb.save(self.path)
+        trans = DumpExcel(self.path).get_translations('GAME.EXE')
+        self.assertEqual([t.location for t in trans], [0x50])
+
+
+class TestPointerExcel(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'pointers.xlsx')
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'GAME.EXE'
+        ws.append(['Text Loc', 'Ptr Loc', 'Bytes', 'Points To', 'Comments'])
+        ws.append(['0x200', '0x10', '00 01', ''])
+        ws.append(['0x200', '0x20', '00 01', ''])
+        ws.append(['0x300', '0x30', '00 02', ''])
+        wb.save(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_get_pointers(self):
+        pointer_excel = PointerExcel(self.path)
+        pointers = pointer_excel.get_pointers(FakeGamefile('GAME.EXE'), 'GAME.EXE')
+        pointer_excel.close()
+        self.assertEqual(list(pointers), [0x200, 0x300])
+        self.assertEqual([p.location for p in pointers[0x200]], [0x10, 0x20])
+        self.assertEqual(pointers[0x300][0].value, '00 02')
+
+
+class TestControlCodeTable(unittest.TestCase):
+    CODES = {b'[W]': b'\x13', b'[WAIT]': b'\x14', b'[BLANK]': b'', b'[N]': b'\x0a'}
+
+    def test_longest_code_wins(self):
+        table = ControlCodeTable(self.CODES)
+        self.assertEqual(table.encode(b'Hi[WAIT][W][N]'), b'Hi\x14\x13\x0a')
+        self.assertEqual(table.encode(b'[BLANK]'), b'')
+
+    def test_decode(self):
+        table = ControlCodeTable(self.CODES)
+        self.assertEqual(table.decode(b'Hi\x14\x13\x0a'), b'Hi[WAIT][W][N]')
+        self.assertEqual(table.mapping('decode'), {b'\x13': b'[W]', b'\x14': b'[WAIT]', b'\x0a': b'[N]'})
+
+    def test_str_names(self):
+        table = ControlCodeTable({'[W]': b'\x13'})
+        self.assertEqual(table.encode('あ[W]'.encode('shift-jis')), 'あ'.encode('shift-jis') + b'\x13')
+        self.assertEqual(sjis_to_hex_string('あ[W]', {'[W]': b'\x13'}), 'あ'.encode('shift-jis') + b'\x13')
+
+    def test_of_caches_by_dict(self):
+        table = ControlCodeTable.of(self.CODES)
+        self.assertIs(ControlCodeTable.of(self.CODES), table)
+        self.assertIs(ControlCodeTable.of(table), table)
+
+        # A code added later gets picked up
+        codes = {b'[W]': b'\x13'}
+        self.assertEqual(sjis_to_hex_string('[W][N]', codes), b'\x13[N]')
+        codes[b'[N]'] = b'\x0a'
+        self.assertEqual(sjis_to_hex_string('[W][N]', codes), b'\x13\x0a')
+        for i in range(ControlCodeTable.MAX_CACHED_TABLES + 1):
+            ControlCodeTable.of({b'[%i]' % i: b'\x01'})
+        self.assertLessEqual(len(ControlCodeTable._tables), ControlCodeTable.MAX_CACHED_TABLES)
+
+    def test_translation(self):
+        t = Translation(None, 0, b'[W]', b'Hi[W]', control_codes=self.CODES)
+        self.assertEqual(t.jp_bytestring, b'\x13')
+        self.assertEqual(t.en_bytestring, b'Hi\x13')
+
+
+class TestPointerTexts(unittest.TestCase):
+    def test_bulk_matches_single(self):
+        gf = FakeGamefile('GAME.EXE')
+        long_string = 'あいうえおかきくけこさしすせそたちつてと'.encode('shift-jis')
+        gf.filestring = gf.original_filestring = (b'\x00' + long_string + b'\x00Hi\x13\x00\xff\xfe\x00end')
+        pointers = [BorlandPointer(gf, 0, loc) for loc in (0x1, 0x2a, 0x2e, 0x31)]
+        codes = {b'[W]': b'\x13'}
+
+        texts = pointer_texts(pointers, control_codes=codes)
+        self.assertEqual([t.text for t in texts],
+                         ['あいうえおかきくけこさしすせそたちつてと', 'Hi[W]', 'ff fe', 'end'])
+        self.assertEqual([t.text for t in texts], [p.text(codes) for p in pointers])
+        self.assertEqual(texts[0].text, pointers[0].original_text())
+        self.assertEqual((texts[1].start, texts[1].stop), (0x2a, 0x2d))
+
+    def test_original_after_edit(self):
+        gf = FakeGamefile('GAME.EXE')
+        gf.original_filestring = b'\x00ABC\x00DEF\x00'
+        gf.filestring = b'\x00DEF\x00ABC\x00'
+        pointer = BorlandPointer(gf, 0, 0x1)
+        # The strings swapped places, so the pointer to "ABC" moved
+        pointer.text_location = 0x5
+        self.assertEqual(pointer_texts([pointer])[0].text, 'ABC')
+        self.assertEqual(pointer_texts([pointer], original=True)[0].text, 'ABC')
+        self.assertEqual(pointer.original_text(), 'ABC')
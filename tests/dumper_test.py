@@ -0,0 +1,77 @@
+import unittest
+import os
+import tempfile
+from collections import OrderedDict
+
+from romtools.dumper import sjis_runs, detect_blocks, write_rominfo
+
+
+class TestSjisRuns(unittest.TestCase):
+    def test_runs(self):
+        contents = b'\x00' + 'あい'.encode('shift-jis') + b'\x00\x00' + 'う'.encode('shift-jis')
+        self.assertEqual(sjis_runs(contents),
+                         [(1, 'あい'.encode('shift-jis')), (7, 'う'.encode('shift-jis'))])
+
+    def test_invalid_trail_byte(self):
+        # 0x82 0x00 isn't a SJIS character
+        self.assertEqual(sjis_runs(b'\x82\x00\x82\xa0'), [(2, b'\x82\xa0')])
+
+    def test_lead_bytes_pair_up_from_the_start(self):
+        # 82 82 a0: the first two bytes are a character, so a0 isn't part of it
+        self.assertEqual(sjis_runs(b'\x82\x82\xa0\x00'), [(0, b'\x82\x82')])
+        # 82 82 82 a0: two characters
+        self.assertEqual(sjis_runs(b'\x82\x82\x82\xa0'), [(0, b'\x82\x82\x82\xa0')])
+
+    def test_start_and_ascii(self):
+        contents = b'ab' + 'あ'.encode('shift-jis') + b'cd\x00'
+        self.assertEqual(sjis_runs(contents, start=2), [(2, 'あ'.encode('shift-jis'))])
+        self.assertEqual(sjis_runs(contents, ascii_mode=2), [(0, contents[:-1])])
+
+
+class TestDetectBlocks(unittest.TestCase):
+    def spans(self, contents):
+        return [(o, len(s)) for o, s in sjis_runs(contents)]
+
+    def test_blocks(self):
+        a, b = 'あいう'.encode('shift-jis'), 'えお'.encode('shift-jis')
+        # Two strings split by a separator and an ASCII control code, then
+        # binary data, then one more string.
+        contents = a + b'\x00<C>' + b + b'\x00' + b'\x01\x02\xff' + a + b'\x00'
+        blocks = detect_blocks(contents, self.spans(contents))
+        self.assertEqual(blocks, [(0, 15), (18, 25)])
+
+    def test_gap_threshold(self):
+        a = 'あいう'.encode('shift-jis')
+        contents = a + b'\x00' * 8 + a + b'\x00'
+        self.assertEqual(len(detect_blocks(contents, self.spans(contents))), 1)
+        self.assertEqual(len(detect_blocks(contents, self.spans(contents), max_gap=4)), 2)
+
+
+class TestWriteRominfo(unittest.TestCase):
+    def test_skeleton(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'rominfo.py')
+            write_rominfo(path, {('A', 'GAME.EXE'): [(0x100, 0x180)]})
+            rominfo = {}
+            with open(path, encoding='utf-8') as f:
+                exec(f.read(), rominfo)
+        self.assertEqual(rominfo['FILE_BLOCKS'], {'GAME.EXE': [(0x100, 0x180)]})
+        self.assertEqual(rominfo['DISKS'], ['A'])
+        self.assertEqual(rominfo['FILES_TO_PATCH'], {'A': ['GAME.EXE']})
+
+    def test_same_filenames(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'rominfo.py')
+            write_rominfo(path, OrderedDict([(('A', 'GAME.EXE'), [(0x10, 0x20)]),
+                                             (('A', 'DATA/MSG.DAT'), [(0x30, 0x40)]),
+                                             (('B', 'DATA/MSG.DAT'), [(0x50, 0x60)]),
+                                             (('B', 'EXTRA/MSG.DAT'), [(0x70, 0x80)])]))
+            rominfo = {}
+            with open(path, encoding='utf-8') as f:
+                exec(f.read(), rominfo)
+        self.assertEqual(rominfo['FILE_BLOCKS'], {'GAME.EXE': [(0x10, 0x20)],
+                                                  'A:DATA/MSG.DAT': [(0x30, 0x40)],
+                                                  'B:DATA/MSG.DAT': [(0x50, 0x60)],
+                                                  'EXTRA/MSG.DAT': [(0x70, 0x80)]})
+        self.assertEqual(rominfo['FILES_TO_PATCH'], {'A': ['GAME.EXE', 'A:DATA/MSG.DAT'],
+                                                     'B': ['B:DATA/MSG.DAT', 'EXTRA/MSG.DAT']})
@@ -0,0 +1,129 @@
+import unittest
+import os
+import struct
+import tempfile
+import shutil
+
+from romtools.fat import FATImage, FATError
+
+SECTOR = 1024
+FDI_HEADER = 0x1000
+FAT_OFFSET = SECTOR
+ROOT_OFFSET = SECTOR * 5
+CLUSTER_OFFSET = SECTOR * 11
+
+
+def set_fat12(image, cluster, value):
+    for fat in (FAT_OFFSET, FAT_OFFSET + 2 * SECTOR):
+        i = fat + cluster * 3 // 2
+        old = struct.unpack_from('<H', image, i)[0]
+        if cluster & 1:
+            new = (old & 0x000f) | (value << 4)
+        else:
+            new = (old & 0xf000) | value
+        struct.pack_into('<H', image, i, new)
+
+
+def dir_entry(name, ext, attributes, cluster, size):
+    return name.ljust(8) + ext.ljust(3) + bytes([attributes]) + b'\x00' * 14 + struct.pack('<HI', cluster, size)
+
+
+def cluster(n):
+    return CLUSTER_OFFSET + (n - 2) * SECTOR
+
+
+def make_2hd_image():
+    """A 1.23MB PC-98 2HD FAT12 disk with a fragmented GAME.EXE and DATA/A.DAT."""
+    image = bytearray(1232 * SECTOR)
+    image[0:3] = b'\xeb\x3c\x90'
+    struct.pack_into('<HBHBHHBH', image, 0x0b, SECTOR, 1, 1, 2, 192, 1232, 0xfe, 2)
+    set_fat12(image, 0, 0xffe)
+    set_fat12(image, 1, 0xfff)
+
+    game = bytes(range(256)) * 10   # 2560 bytes: clusters 2, 3 and 5
+    image[cluster(2):cluster(2) + 2048] = game[:2048]
+    image[cluster(5):cluster(5) + 512] = game[2048:]
+    set_fat12(image, 2, 3)
+    set_fat12(image, 3, 5)
+    set_fat12(image, 5, 0xfff)
+
+    image[ROOT_OFFSET:ROOT_OFFSET + 32] = dir_entry(b'GAME', b'EXE', 0x20, 2, len(game))
+    image[ROOT_OFFSET + 32:ROOT_OFFSET + 64] = dir_entry(b'DATA', b'', 0x10, 6, 0)
+    set_fat12(image, 6, 0xfff)
+    image[cluster(6):cluster(6) + 32] = dir_entry(b'.', b'', 0x10, 6, 0)
+    image[cluster(6) + 32:cluster(6) + 64] = dir_entry(b'A', b'DAT', 0x20, 7, 5)
+    image[cluster(7):cluster(7) + 5] = b'hello'
+    set_fat12(image, 7, 0xfff)
+
+    header = bytearray(FDI_HEADER)
+    struct.pack_into('<5I', header, 0x08, FDI_HEADER, len(image), SECTOR, 8, 2)
+    return bytes(header + image), game
+
+
+class TestFATImage(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'GAME.FDI')
+        data, self.game = make_2hd_image()
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_read(self):
+        with FATImage(self.path) as image:
+            self.assertEqual(image.fat_bits, 12)
+            self.assertEqual([e.path for e in image.files()], ['GAME.EXE', 'DATA/A.DAT'])
+            self.assertEqual(image.read('GAME.EXE'), self.game)
+            self.assertEqual(image.read('DATA/A.DAT'), b'hello')
+            self.assertEqual(image.find('a.dat'), ['DATA/A.DAT'])
+            self.assertEqual(image.extents(image.entries()['GAME.EXE']),
+                             [(FDI_HEADER + cluster(2), 2048), (FDI_HEADER + cluster(5), 512)])
+
+    def test_resolve(self):
+        with FATImage(self.path) as image:
+            self.assertEqual(image.resolve('GAME.EXE'), 'GAME.EXE')
+            self.assertEqual(image.resolve('A.DAT', 'DATA\\'), 'DATA/A.DAT')
+            self.assertEqual(image.resolve('A.DAT', '0\\DATA'), 'DATA/A.DAT')
+            self.assertIsNone(image.resolve('B.DAT', 'DATA'))
+            self.assertIsNone(image.resolve('A.DAT'))
+
+    def test_resolve_same_names(self):
+        # Another A.DAT, in the root
+        data = bytearray(make_2hd_image()[0])
+        image = data[FDI_HEADER:]
+        image[ROOT_OFFSET + 64:ROOT_OFFSET + 96] = dir_entry(b'A', b'DAT', 0x20, 8, 5)
+        image[cluster(8):cluster(8) + 5] = b'world'
+        set_fat12(image, 8, 0xfff)
+        with open(self.path, 'wb') as f:
+            f.write(data[:FDI_HEADER] + image)
+
+        with FATImage(self.path) as image:
+            self.assertEqual(image.resolve('A.DAT'), 'A.DAT')
+            self.assertEqual(image.resolve('A.DAT', '0\\'), 'A.DAT')
+            self.assertEqual(image.resolve('A.DAT', 'DATA'), 'DATA/A.DAT')
+            self.assertEqual(image.resolve('A.DAT', '0\\DATA\\'), 'DATA/A.DAT')
+            # A folder fat.py can't see doesn't fall back to the root one
+            self.assertIsNone(image.resolve('A.DAT', 'OTHER'))
+
+    def test_write_in_place(self):
+        patched = bytearray(self.game)
+        patched[10:14] = b'ABCD'
+        patched[2040:2060] = b'x' * 20    # straddles the fragment
+        with FATImage(self.path, writable=True) as image:
+            self.assertEqual(image.write_in_place('GAME.EXE', bytes(patched)), 24)
+            with self.assertRaises(FATError):
+                image.write_in_place('DATA/A.DAT', b'hello!')
+        with FATImage(self.path) as image:
+            self.assertEqual(image.read('GAME.EXE'), bytes(patched))
+            self.assertEqual(image.read('DATA/A.DAT'), b'hello')
+            with self.assertRaises(FATError):
+                image.write_in_place('GAME.EXE', self.game)
+
+    def test_unsupported(self):
+        d88 = os.path.join(self.dir, 'GAME.D88')
+        with open(d88, 'wb') as f:
+            f.write(b'\x00' * 0x1000)
+        with self.assertRaises(FATError):
+            FATImage(d88)
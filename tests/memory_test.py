@@ -0,0 +1,47 @@
+import unittest
+import os
+import tempfile
+import shutil
+from openpyxl import Workbook
+
+from romtools.dump import DumpExcel
+from romtools.memory import TranslationMemory
+
+
+class TestTranslationMemory(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.xlsx_path = os.path.join(self.dir, 'dump.xlsx')
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'Everything'
+        ws.append(['Offset', 'Japanese', 'English', 'File'])
+        ws.append(['0x10', 'はい', 'Yes', 'A.EXE'])
+        ws.append(['0x20', 'いいえ', None, 'A.EXE'])
+        ws.append(['0x10', 'はい', None, 'B.EXE'])
+        ws.append(['0x30', 'いいえ', None, 'B.EXE'])
+        wb.save(self.xlsx_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_fan_out(self):
+        memory = TranslationMemory(DumpExcel(self.xlsx_path, use_sidecar=False))
+        self.assertEqual(len(memory), 2)
+        self.assertEqual(len(memory.duplicates()), 2)
+
+        trans = memory.get_translations('B.EXE', sheet_name='Everything')
+        self.assertEqual([(t.location, t.en_bytestring) for t in trans], [(0x10, b'Yes')])
+
+    def test_write_and_load(self):
+        memory = TranslationMemory(DumpExcel(self.xlsx_path, use_sidecar=False))
+        for ext in ('.xlsx', '.csv'):
+            path = os.path.join(self.dir, 'memory' + ext)
+            memory.write(path)
+            self.assertEqual(memory.load(path), 0)
+
+        with open(os.path.join(self.dir, 'memory.csv'), 'w', encoding='utf-8') as f:
+            f.write('Japanese,English,Count,Locations\nいいえ,No,2,\n')
+        self.assertEqual(memory.load(os.path.join(self.dir, 'memory.csv')), 1)
+        trans = memory.get_translations('B.EXE', sheet_name='Everything')
+        self.assertEqual([t.english for t in trans], [b'Yes', b'No'])
@@ -7,7 +7,12 @@
 import unittest
 import os
 import shutil
+import tempfile
 from subprocess import run, PIPE
+from unittest import mock
+from romtools import pachy98
+from romtools.pachy98 import is_file_patched, is_image_patched, image_patch_applies, patch_name, reserve_patch_names
+from romtools.utils import file_hash
 #from romtools.disk import Disk, Gamefile, Block, Overflow
 #from romtools.dump import DumpExcel, PointerExcel
 
@@ -142,3 +147,84 @@ class CRWFDTest(unittest.TestCase):
 
         penultimate_line = p.stdout.splitlines()[-2]
         assert b'Patching complete!' in penultimate_line
+
+
+class AlreadyPatchedTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'GAME.EXE')
+        with open(self.path, 'wb') as f:
+            f.write(b'patched')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_file_hashes(self):
+        f = {'name': 'GAME.EXE', 'patch': 'GAME.EXE.xdelta',
+             'target_hashes': {'GAME.EXE.xdelta': file_hash(self.path), 'GAME.EXE.alt.xdelta': '0'}}
+        self.assertTrue(is_file_patched(self.path, f, ['GAME.EXE.xdelta']))
+        # Patched with a different option's patch
+        self.assertFalse(is_file_patched(self.path, f, ['GAME.EXE.alt.xdelta']))
+        self.assertFalse(is_file_patched(self.path, {'name': 'GAME.EXE'}, ['GAME.EXE.xdelta']))
+
+    def test_image_hash(self):
+        self.assertTrue(is_image_patched(self.path, {'target_hash': file_hash(self.path)}))
+        self.assertFalse(is_image_patched(self.path, {}))
+
+    def test_image_patch(self):
+        image_hash = file_hash(self.path)
+        image = {'source_hash': image_hash, 'image_patch': 'GAME.FDI.xdelta',
+                 'floppy': {'files': [{'name': 'GAME.EXE', 'patch': 'GAME.EXE.xdelta'}]}}
+        self.assertTrue(image_patch_applies(image, image_hash))
+        self.assertFalse(image_patch_applies(image, '0'))
+        self.assertFalse(image_patch_applies({'source_hash': image_hash}, image_hash))
+        # An option picks the file patches, so the image patch can't be trusted
+        image['floppy']['files'][0]['patch'] = {'type': 'boolean', 'id': 'opt', 'true': 'a', 'false': 'b'}
+        self.assertFalse(image_patch_applies(image, image_hash))
+
+    def test_image_patch_new_files(self):
+        # New files still get inserted when the whole image was patched at once
+        inserted = []
+
+        class FakeDisk:
+            extension = 'fdi'
+
+            def __init__(self, filename, **kwargs):
+                pass
+
+            def backup(self):
+                pass
+
+            def insert(self, filepath, path_in_disk='', delete_original=True):
+                inserted.append((os.path.basename(filepath), path_in_disk))
+
+        class FakePatch:
+            def __init__(self, original, edited):
+                self.original, self.edited = original, edited
+
+            def apply(self):
+                shutil.copyfile(self.original, self.edited)
+
+        class FakeConfig:
+            images = [{'source_hash': file_hash(self.path), 'image_patch': 'GAME.FDI.xdelta',
+                       'floppy': {'files': [{'name': 'GAME.EXE', 'patch': 'GAME.EXE.xdelta'}]}}]
+            new_files = [{'name': 'NEW.TXT'}]
+            bundle = None
+
+            def patch(self, original, patch, edited, xdelta_dir):
+                return FakePatch(original, edited)
+
+        with mock.patch.object(pachy98, 'Disk', FakeDisk), \
+                mock.patch.object(pachy98, 'exe_dir', self.dir, create=True):
+            pachy98.patch_images([self.path], FakeConfig())
+        self.assertEqual(inserted, [('NEW.TXT', '')])
+
+    def test_patch_name(self):
+        self.assertEqual(patch_name('GAME.EXE'), 'GAME.EXE.xdelta')
+        self.assertNotEqual(patch_name('DATA/MSG.DAT'), patch_name('EXTRA/MSG.DAT'))
+
+    def test_reserve_patch_names(self):
+        used = set()
+        self.assertIsNone(reserve_patch_names([patch_name('GAME.EXE'), 'GAME.FDI.xdelta'], used))
+        # A file that flattens to the image patch's name
+        self.assertEqual(reserve_patch_names([patch_name('GAME.FDI')], used), 'GAME.FDI.xdelta')
@@ -0,0 +1,39 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from romtools.patch import PROFILES, Patch, benchmark
+
+XDELTA = shutil.which('xdelta3')
+
+
+class TestProfiles(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.original = os.path.join(self.dir, 'GAME.EXE')
+        self.edited = os.path.join(self.dir, 'GAME.EXE_edited')
+        data = bytes(range(256)) * 64
+        with open(self.original, 'wb') as f:
+            f.write(data)
+        with open(self.edited, 'wb') as f:
+            f.write(data[:1000] + b'Translated!' + data[1000:])
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_bad_profile(self):
+        patch = Patch(self.original, os.path.join(self.dir, 'GAME.EXE.xdelta'), edited=self.edited)
+        with self.assertRaises(ValueError):
+            patch.create('tiniest')
+
+    @unittest.skipUnless(XDELTA, 'No xdelta3')
+    def test_profiles_round_trip(self):
+        results = benchmark([(self.original, self.edited)], self.dir, xdelta_dir=os.path.dirname(XDELTA))
+        self.assertEqual([r.profile for r in results], list(PROFILES))
+        for r in results:
+            if r.profile == 'smallest' and r.error:
+                # Needs an xdelta3 built with liblzma
+                continue
+            self.assertIsNone(r.error, r.profile)
+            self.assertGreater(r.size, 0)
@@ -0,0 +1,33 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from romtools.pointer_peek import peek_pointers, PTR_BEGIN
+
+
+class TestPeekPointers(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'GAME.EXE')
+        data = bytearray(0x30)
+        data[0:2] = (0x10).to_bytes(2, 'little')
+        # A pointer listed 2 bytes too early, at the "ptr begin" code
+        data[4:6] = PTR_BEGIN.to_bytes(2, 'little')
+        data[6:8] = (0x18).to_bytes(2, 'little')
+        data[0x10:0x15] = 'あい'.encode('shift-jis') + b'\x00'
+        data[0x18:0x1b] = b'Hi\x00'
+        with open(self.path, 'wb') as f:
+            f.write(data)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_batch(self):
+        peeks = peek_pointers(self.path, [0, 4, 0x100], 0)
+        self.assertEqual([(p.requested, p.offset, p.target, p.text) for p in peeks],
+                         [(0, 0, 0x10, 'あい'), (4, 6, 0x18, 'Hi')])
+
+    def test_constant(self):
+        peek, = peek_pointers(self.path, [0], -0x8)
+        self.assertEqual((peek.target, peek.bytestring), (0x8, b''))
@@ -0,0 +1,30 @@
+import unittest
+
+from romtools.dump import DumpRow
+from romtools.rebase import KmerIndex, rebase
+
+
+def row(offset, japanese):
+    return DumpRow(None, offset, None, None, None, japanese.encode('shift-jis'), None,
+                   None, None, None, None, None, None)
+
+
+class TestRebase(unittest.TestCase):
+    def test_find_all(self):
+        index = KmerIndex(b'xxabcdexxabcdeabc')
+        self.assertEqual(index.find_all(b'abcde'), [2, 9])
+        self.assertEqual(index.find_all(b'abc'), [2, 9, 14])
+        self.assertEqual(index.find_all(b'zzzz'), [])
+
+    def test_duplicates_follow_their_neighbors(self):
+        def block(*strings):
+            return b''.join(s.encode('shift-jis') + b'\x00' for s in strings)
+        old = block('剣の店', 'はい', '鎧の店', 'はい')
+        # The new version has 0x20 bytes of new stuff, and an extra "はい" up front.
+        new = block('はい') + b'\xff' * 0x1b + old
+
+        rows = [row(0, '剣の店'), row(7, 'はい'), row(12, '鎧の店'), row(19, 'はい'), row(None, '無い')]
+        results = rebase(rows, new)
+        self.assertEqual([(r.new_offset, r.status) for r in results],
+                         [(0x20, 'unique'), (0x27, 'anchored'), (0x2c, 'unique'), (0x33, 'anchored'),
+                          (None, 'missing')])
@@ -0,0 +1,57 @@
+import unittest
+import os
+import tempfile
+import shutil
+
+from romtools.reinsert import ReinsertJob, reinsert
+from romtools.cache import BuildCache
+
+
+def build(job):
+    """Uppercase the source into a .out file. Jobs with data='skip' write nothing."""
+    if job.data == 'skip':
+        return None
+    with open(job.source, 'rb') as f:
+        contents = f.read()
+    written = job.source + '.out'
+    with open(written, 'wb') as f:
+        f.write(contents.upper())
+    return written, (job.source, {'output': written})
+
+
+class FakeDisk(object):
+    def __init__(self, filename, inserted):
+        self.filename = filename
+        self.inserted = inserted
+
+    def insert(self, filepath, path_in_disk=None):
+        with open(filepath, 'rb') as f:
+            self.inserted.append((self.filename, path_in_disk, f.read()))
+
+
+class TestReinsert(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.sources = []
+        for name in ('A.EXE', 'B.EXE', 'C.EXE'):
+            path = os.path.join(self.dir, name)
+            with open(path, 'wb') as f:
+                f.write(name.encode('ascii').lower())
+            self.sources.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_reinsert(self):
+        inserted = []
+        jobs = [ReinsertJob(self.sources[0], 'DISK1.HDM', 'GAME'),
+                ReinsertJob(self.sources[1], 'DISK2.HDM'),
+                ReinsertJob(self.sources[2], 'DISK1.HDM', 'GAME', 'skip')]
+        cache = BuildCache(os.path.join(self.dir, 'build_cache.json'))
+        written = reinsert(jobs, build, max_workers=2, cache=cache,
+                           open_disk=lambda p: FakeDisk(p, inserted))
+
+        self.assertEqual(written, [self.sources[0] + '.out', self.sources[1] + '.out', None])
+        self.assertEqual(sorted(inserted), [('DISK1.HDM', 'GAME', b'A.EXE'), ('DISK2.HDM', '', b'B.EXE')])
+        self.assertEqual(sorted(cache.entries), sorted(self.sources[:2]))
+        self.assertTrue(os.path.isfile(cache.path))
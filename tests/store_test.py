@@ -0,0 +1,87 @@
+import unittest
+import os
+import tempfile
+import shutil
+from openpyxl import Workbook, load_workbook
+
+from romtools.store import DelimitedStore, import_excel
+from romtools.dump import DumpExcel
+from romtools.memory import TranslationMemory
+from romtools.checker import WidthChecker
+
+
+class FakeGamefile(object):
+    def __init__(self, filename):
+        self.filename = filename
+
+
+class FakeBlock(object):
+    def __init__(self, gamefile, start, stop):
+        self.gamefile = gamefile
+        self.start = start
+        self.stop = stop
+
+
+class TestStores(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.xlsx_path = os.path.join(self.dir, 'dump.xlsx')
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'Everything'
+        ws.append(['Offset', 'Japanese', 'English', 'File', 'Pointer'])
+        ws.append(['0x30', 'う', 'u', 'A.EXE', None])
+        ws.append(['0x10', 'あ', 'a', 'A.EXE', '0x2; 0x4'])
+        ws.append(['0x20', 'い', None, 'A.EXE', None])
+        ws.append(['0x10', 'か', 'ka', 'B.EXE', None])
+        wb.save(self.xlsx_path)
+
+        self.csv_dir = os.path.join(self.dir, 'csv')
+        os.mkdir(self.csv_dir)
+        with open(os.path.join(self.csv_dir, 'Everything.csv'), 'w', encoding='utf-8') as f:
+            f.write('Offset,Japanese,English,File,Pointer\n'
+                    '0x30,う,u,A.EXE,\n'
+                    '0x10,あ,a,A.EXE,0x2; 0x4\n'
+                    '0x20,い,,A.EXE,\n'
+                    '0x10,か,ka,B.EXE,\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check_store(self, store):
+        trans = store.get_translations('A.EXE', sheet_name='Everything')
+        self.assertEqual([t.location for t in trans], [0x30, 0x10])
+        self.assertEqual(trans[1].pointers, [0x2, 0x4])
+
+        block = FakeBlock(FakeGamefile('A.EXE'), 0x10, 0x30)
+        trans = store.get_translations(block, sheet_name='Everything', include_blank=True)
+        self.assertEqual([(t.location, t.english) for t in trans], [(0x10, b'a'), (0x20, b'')])
+
+        trans = store.get_translations('B.EXE', sheet_name='Everything')
+        self.assertEqual([t.japanese for t in trans], ['か'.encode('shift-jis')])
+
+    def test_sqlite_store(self):
+        store = import_excel(self.xlsx_path, os.path.join(self.dir, 'dump.sqlite'))
+        self.check_store(store)
+        store.close()
+
+    def test_delimited_store(self):
+        self.check_store(DelimitedStore(self.csv_dir))
+
+    def test_empty_sheet(self):
+        wb = load_workbook(self.xlsx_path)
+        wb.create_sheet('Notes')
+        wb.save(self.xlsx_path)
+        open(os.path.join(self.csv_dir, 'Notes.csv'), 'w').close()
+
+        stores = [DumpExcel(self.xlsx_path, use_sidecar=False), DumpExcel(self.xlsx_path),
+                  import_excel(self.xlsx_path, os.path.join(self.dir, 'dump.sqlite')),
+                  DelimitedStore(self.csv_dir)]
+        for store in stores:
+            if 'Notes' in store.sheetnames:
+                # (import_excel leaves it out)
+                with self.assertRaises(ValueError):
+                    store.rows('Notes')
+            self.check_store(store)
+            self.assertEqual(TranslationMemory(store).sheetnames, ['Everything'])
+            self.assertEqual(WidthChecker(80).check_store(store), [])
@@ -0,0 +1,46 @@
+import unittest
+import os
+import json
+import tempfile
+import shutil
+
+from openpyxl import load_workbook
+from romtools.writers import open_dump_writer
+
+COLUMNS = ['Offset', 'Japanese', 'File', 'Comments']
+ROWS = [['0x00001', 'あいう', 'A.EXE', None], ['0x00002', '亜唖', 'B.DAT', None]]
+
+
+class TestDumpWriters(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, filename):
+        path = os.path.join(self.dir, filename)
+        with open_dump_writer(path, COLUMNS, [8, 60, 15, 60]) as writer:
+            for row in ROWS:
+                writer.write_row(row)
+        return path
+
+    def test_xlsx(self):
+        wb = load_workbook(self.write('dump.xlsx'), read_only=True)
+        rows = [list(r) for r in wb['Everything'].iter_rows(values_only=True)]
+        self.assertEqual(rows, [COLUMNS] + ROWS)
+
+    def test_csv(self):
+        with open(self.write('dump.csv'), encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], 'Offset,Japanese,File,Comments')
+        self.assertEqual(lines[1], '0x00001,あいう,A.EXE,')
+
+    def test_jsonl(self):
+        with open(self.write('dump.jsonl'), encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(rows[1]['Japanese'], '亜唖')
+
+    def test_unknown_extension(self):
+        with self.assertRaises(ValueError):
+            open_dump_writer(os.path.join(self.dir, 'dump.doc'), COLUMNS)
@@ -0,0 +1,50 @@
+import unittest
+import os
+import tempfile
+import shutil
+from openpyxl import Workbook
+
+from romtools.xref import PointerIndex
+
+
+class TestPointerIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check(self, index):
+        self.assertEqual(sorted(index.pointers_to(0x100)), [0x10, 0x20])
+        self.assertEqual(index.pointers_into(0x100, 0x200), [(0x10, 0x100), (0x20, 0x100), (0x30, 0x180)])
+        self.assertEqual(index.pointers_in(0x15, 0x40), [(0x20, 0x100), (0x30, 0x180)])
+        self.assertEqual(index.target_of(0x30), 0x180)
+        self.assertIsNone(index.target_of(0x31))
+        self.assertEqual(index.targets_of([0x10, 0x11]).tolist(), [0x100, -1])
+
+    def test_save_and_mmap(self):
+        index = PointerIndex([0x30, 0x10, 0x20, 0x40], [0x180, 0x100, 0x100, 0x200])
+        self.check(index)
+        path = os.path.join(self.dir, 'GAME.EXE.xref.npy')
+        index.save(path)
+        self.check(PointerIndex.load(path))
+
+    def test_from_sheet_and_cached(self):
+        sheet_path = os.path.join(self.dir, 'pointers.xlsx')
+        wb = Workbook()
+        ws = wb.active
+        ws.title = 'GAME.EXE'
+        ws.append(['Text Loc', 'Ptr Loc', 'Bytes', 'Points To'])
+        for text_loc, ptr_loc in ((0x100, 0x10), (0x100, 0x20), (0x180, 0x30), (0x200, 0x40)):
+            ws.append([hex(text_loc), hex(ptr_loc)])
+        wb.save(sheet_path)
+
+        path = os.path.join(self.dir, 'GAME.EXE.xref.npy')
+        index = PointerIndex.cached(path, sheet_path, lambda: PointerIndex.from_sheet(sheet_path, 'GAME.EXE'))
+        self.check(index)
+        self.check(PointerIndex.cached(path, sheet_path, lambda: self.fail("Rebuilt a fresh index")))
+
+    def test_from_scan(self):
+        filestring = b'\x00\x00\x08\x00' + b'\x00' * 8 + b'\x00Hi\x00'
+        index = PointerIndex.from_scan(filestring, [0xd], constant=5, separator=b'\x00')
+        self.assertEqual(index.pointers_to(0xd), [2])
@@ -0,0 +1,107 @@
+"""
+Row-at-a-time writers for dump output: xlsx, CSV/TSV and JSON lines.
+Rows go out as soon as they're written, so a dump's memory use doesn't grow
+with the number of strings in it. The xlsx writer uses xlsxwriter's
+constant_memory mode, which means rows have to be written top to bottom.
+"""
+
+import csv
+import json
+from os.path import splitext
+import xlsxwriter
+
+HEADER_FORMAT = {'bold': True, 'align': 'center', 'bottom': True, 'bg_color': 'gray'}
+
+
+class DumpWriter(object):
+    """Writes a header row, then one row per write_row() call."""
+    def __init__(self, path, columns, widths=None, sheet_name='Everything'):
+        self.path = path
+        self.columns = list(columns)
+        self.rows_written = 0
+
+    def write_row(self, values):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class XlsxDumpWriter(DumpWriter):
+    def __init__(self, path, columns, widths=None, sheet_name='Everything'):
+        super(XlsxDumpWriter, self).__init__(path, columns, widths, sheet_name)
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self.worksheet = self.workbook.add_worksheet(sheet_name)
+        header = self.workbook.add_format(HEADER_FORMAT)
+        for i, width in enumerate(widths or []):
+            if width:
+                self.worksheet.set_column(i, i, width)
+        for i, c in enumerate(self.columns):
+            self.worksheet.write(0, i, c, header)
+
+    def write_row(self, values):
+        self.rows_written += 1
+        for i, v in enumerate(values):
+            if v is not None:
+                self.worksheet.write(self.rows_written, i, v)
+
+    def close(self):
+        self.workbook.close()
+
+
+class CsvDumpWriter(DumpWriter):
+    """Comma-separated, or tab-separated if the path ends in .tsv/.txt."""
+    def __init__(self, path, columns, widths=None, sheet_name='Everything'):
+        super(CsvDumpWriter, self).__init__(path, columns, widths, sheet_name)
+        delimiter = ',' if splitext(path)[1].lower() == '.csv' else '\t'
+        # utf-8-sig so Excel recognizes the encoding
+        self.file = open(path, 'w', encoding='utf-8-sig', newline='')
+        self.writer = csv.writer(self.file, delimiter=delimiter)
+        self.writer.writerow(self.columns)
+
+    def write_row(self, values):
+        self.rows_written += 1
+        self.writer.writerow(['' if v is None else v for v in values])
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlDumpWriter(DumpWriter):
+    """One json object per line, keyed by column name."""
+    def __init__(self, path, columns, widths=None, sheet_name='Everything'):
+        super(JsonlDumpWriter, self).__init__(path, columns, widths, sheet_name)
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write_row(self, values):
+        self.rows_written += 1
+        self.file.write(json.dumps(dict(zip(self.columns, values)), ensure_ascii=False))
+        self.file.write('\n')
+
+    def close(self):
+        self.file.close()
+
+
+WRITERS = {
+    '.xlsx': XlsxDumpWriter,
+    '.csv': CsvDumpWriter,
+    '.tsv': CsvDumpWriter,
+    '.txt': CsvDumpWriter,
+    '.jsonl': JsonlDumpWriter,
+}
+
+
+def open_dump_writer(path, columns, widths=None, sheet_name='Everything'):
+    """A DumpWriter for path, picked by its extension."""
+    extension = splitext(path)[1].lower()
+    try:
+        writer = WRITERS[extension]
+    except KeyError:
+        raise ValueError('No dump writer for "%s" files' % extension)
+    return writer(path, columns, widths, sheet_name)
@@ -0,0 +1,149 @@
+"""
+Pointer cross-reference index for a gamefile: every pointer location and the
+text location it points to, sorted both ways.
+* forward: pointer location -> target (target_of, pointers_in)
+* reverse: target -> pointer locations (pointers_to, pointers_into)
+
+Built once from a gamefile's pointer sheet or from a scan of the file, then
+saved as a .npy file that later loads memory-mapped, so nothing gets
+reparsed from the xlsx:
+
+    index = PointerIndex.cached('GAME.EXE.xref.npy', src_path,
+                                lambda: PointerIndex.from_sheet(POINTER_XLS_PATH, 'GAME.EXE'))
+    for location in index.pointers_to(0x1234):
+        ...
+"""
+
+import os
+import numpy as np
+from openpyxl import load_workbook
+
+
+class PointerIndex(object):
+    """
+    Four int64 arrays of the same length, stored as rows of one (4, N) array:
+    locations (sorted) with their targets, and targets (sorted) with their locations.
+    """
+    def __init__(self, locations, targets):
+        locations = np.asarray(locations, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        forward = np.lexsort((targets, locations))
+        reverse = np.lexsort((locations, targets))
+        self._set_arrays(np.stack((locations[forward], targets[forward],
+                                   targets[reverse], locations[reverse])))
+
+    def _set_arrays(self, arrays):
+        self.arrays = arrays
+        self.locations, self.targets, self.by_target, self.target_locations = arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        index = cls.__new__(cls)
+        index._set_arrays(arrays)
+        return index
+
+    @classmethod
+    def from_pointers(cls, pointers):
+        """From a Gamefile's pointers dict ({text location: [BorlandPointer, ...]})."""
+        locations, targets = [], []
+        for text_location, ptrs in (pointers or {}).items():
+            for p in ptrs:
+                locations.append(p.location)
+                targets.append(text_location)
+        return cls(locations, targets)
+
+    @classmethod
+    def from_sheet(cls, pointer_excel_path, sheet_name):
+        """From a pointer sheet's Text Loc/Ptr Loc columns, without making any BorlandPointers."""
+        workbook = load_workbook(pointer_excel_path, read_only=True, data_only=True)
+        locations, targets = [], []
+        try:
+            if sheet_name in workbook.sheetnames:
+                for row in workbook[sheet_name].iter_rows(min_row=2, max_col=2, values_only=True):
+                    try:
+                        targets.append(int(row[0], 16))
+                        locations.append(int(row[1], 16))
+                    except (IndexError, TypeError, ValueError):
+                        if len(targets) > len(locations):
+                            targets.pop()
+        finally:
+            workbook.close()
+        return cls(locations, targets)
+
+    @classmethod
+    def from_scan(cls, filestring, text_locations, constant=0, separator=None):
+        """
+        Scan a whole file for 2-byte little-endian words that, plus constant,
+        equal one of text_locations. With a separator, the target also has to
+        come right after one (i.e. be the start of a string).
+        Every offset gets checked in one numpy pass.
+        """
+        data = np.frombuffer(filestring, dtype=np.uint8)
+        if len(data) < 2:
+            return cls([], [])
+        words = data[:-1].astype(np.int64) | (data[1:].astype(np.int64) << 8)
+        values = words + constant
+        text_locations = np.unique(np.asarray(text_locations, dtype=np.int64))
+        hits = np.flatnonzero(np.isin(values, text_locations))
+        targets = values[hits]
+        if separator is not None:
+            before = targets - 1
+            ok = (before >= 0) & (before < len(data))
+            ok[ok] = data[before[ok]] == ord(separator)
+            hits, targets = hits[ok], targets[ok]
+        return cls(hits, targets)
+
+    def save(self, path):
+        np.save(path, np.ascontiguousarray(self.arrays))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        return cls.from_arrays(np.load(path, mmap_mode='r' if mmap else None))
+
+    @classmethod
+    def cached(cls, path, source_path, build):
+        """
+        Load the index at path if it's newer than source_path (the gamefile or
+        pointer sheet it comes from). Otherwise build() it and save it there.
+        """
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(source_path):
+                return cls.load(path)
+        except OSError:
+            pass
+        index = build()
+        index.save(path)
+        return index
+
+    def __len__(self):
+        return self.arrays.shape[1]
+
+    def pointers_to(self, target):
+        """Locations of every pointer to target."""
+        lo, hi = np.searchsorted(self.by_target, [target, target + 1])
+        return self.target_locations[lo:hi].tolist()
+
+    def pointers_into(self, start, stop):
+        """(location, target) of every pointer with start <= target < stop, by target."""
+        lo, hi = np.searchsorted(self.by_target, [start, stop])
+        return list(zip(self.target_locations[lo:hi].tolist(), self.by_target[lo:hi].tolist()))
+
+    def pointers_in(self, start, stop):
+        """(location, target) of every pointer located in start <= location < stop."""
+        lo, hi = np.searchsorted(self.locations, [start, stop])
+        return list(zip(self.locations[lo:hi].tolist(), self.targets[lo:hi].tolist()))
+
+    def target_of(self, location):
+        """What the pointer at location points to, or None if there isn't one."""
+        i = np.searchsorted(self.locations, location)
+        if i < len(self.locations) and self.locations[i] == location:
+            return int(self.targets[i])
+        return None
+
+    def targets_of(self, locations):
+        """Targets for an array of pointer locations (-1 where there's no pointer)."""
+        locations = np.asarray(locations, dtype=np.int64)
+        i = np.minimum(np.searchsorted(self.locations, locations), max(len(self.locations) - 1, 0))
+        if not len(self.locations):
+            return np.full(len(locations), -1, dtype=np.int64)
+        return np.where(self.locations[i] == locations, self.targets[i], -1)